@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from figma_batch import add_batch_arguments, get_file_keys, run_batch
+from figma_cache import add_cache_arguments, fetch_file_document, safe_filename
+from figma_client import fetch_published, get_token
+from figma_compact import STYLE_FIELDS, TREE_FIELDS
+from figma_daemon import run_in_daemon
+from figma_reports import write_components_report, write_file_header, write_styles_report
+from figma_timings import add_timing_arguments, instrument
+from figma_tokens import DEFAULT_DELTA_E, StyleCollector
+from figma_tree import PageLocator, PrunedVisitor, TreePrinter, skip_hidden, walk
+
+
+ANALYSES = ('file', 'styles', 'components')
+# Node fields each analysis reads from the shared document
+ANALYSIS_FIELDS = {'file': TREE_FIELDS, 'styles': STYLE_FIELDS, 'components': TREE_FIELDS}
+OUTPUT_NAMES = {'file': 'file-structure.txt', 'styles': 'styles.txt', 'components': 'components.txt'}
+
+
+def parse_analyses(value):
+    """Parse a comma-separated subset of ANALYSES, returned in canonical order."""
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = names - set(ANALYSES)
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated list of {', '.join(ANALYSES)}")
+    return [name for name in ANALYSES if name in names]
+
+
+def analyze_file(file_key, args, token, out_dir, out):
+    """Write each selected analysis of one file to out_dir from a single fetch and walk of its document."""
+    analyses = args.analyses
+    fields = tuple(dict.fromkeys(field for name in analyses for field in ANALYSIS_FIELDS[name]))
+
+    # The small /styles and /components requests run while the document downloads
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        published = {
+            kind: executor.submit(fetch_published, file_key, kind, token)
+            for kind in ('styles', 'components') if kind in analyses
+        }
+        data = fetch_file_document(
+            file_key, token, use_cache=not args.no_cache, refresh=args.refresh, fields=fields
+        )
+        published = {kind: future.result() for kind, future in published.items()}
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {name: out_dir / OUTPUT_NAMES[name] for name in analyses}
+    document = data.get('document')
+    tree_out = open(paths['file'], 'w', encoding='utf-8') if 'file' in analyses else None
+    try:
+        # One walk feeds every analysis; --skip-hidden applies to the tree and the styles only
+        visitors = []
+        if tree_out is not None:
+            write_file_header(tree_out, file_key, data)
+            tree_out.write("DOCUMENT STRUCTURE:\n\n" if document else "No document data found\n")
+            visitors.append(TreePrinter(out=tree_out, max_depth=args.depth))
+        collector = StyleCollector()
+        if 'styles' in analyses:
+            visitors.append(collector)
+        if args.skip_hidden:
+            visitors = [PrunedVisitor(visitor, skip_hidden) for visitor in visitors]
+        locator = PageLocator(comp_data.get('node_id') for comp_data in published.get('components', []))
+        if 'components' in analyses:
+            visitors.append(locator)
+        if document:
+            walk(document, visitors)
+    finally:
+        if tree_out is not None:
+            tree_out.close()
+
+    if 'styles' in analyses:
+        with open(paths['styles'], 'w', encoding='utf-8') as f:
+            write_styles_report(f, file_key, data, collector, published['styles'], args.cluster)
+    if 'components' in analyses:
+        with open(paths['components'], 'w', encoding='utf-8') as f:
+            write_components_report(f, file_key, data, published['components'], locator.pages)
+
+    print(f"Analyzed {data.get('name', 'Unknown')} (version {data.get('version', 'N/A')})", file=out)
+    for name in analyses:
+        print(f"  {name}: {paths[name]}", file=out)
+
+
+def main():
+    # Hand the command to a running figma-daemon.py, if any
+    status = run_in_daemon(__file__)
+    if status is not None:
+        sys.exit(status)
+
+    parser = argparse.ArgumentParser(
+        description='Run several analyses of a Figma file from one download and one pass over its document'
+    )
+    parser.add_argument(
+        '--analyses', type=parse_analyses, default=list(ANALYSES), metavar='LIST',
+        help=f"Comma-separated analyses to run: {', '.join(ANALYSES)} (default: all)"
+    )
+    parser.add_argument(
+        '--out', default='.design-companion/figma',
+        help='Output directory for ' + ', '.join(OUTPUT_NAMES.values()) +
+             '; in batch mode each file gets a subdirectory named after its key (default: .design-companion/figma)'
+    )
+    parser.add_argument('--depth', type=int, default=2, help='Depth of the file structure tree (default: 2)')
+    parser.add_argument('--skip-hidden', action='store_true', help='Leave invisible layers out of the tree and the styles')
+    parser.add_argument(
+        '--cluster', type=float, nargs='?', const=DEFAULT_DELTA_E, metavar='DELTA_E',
+        help=f'Merge near-duplicate colors in the styles within this CIE76 ΔE (default: {DEFAULT_DELTA_E})'
+    )
+    add_cache_arguments(parser)
+    add_batch_arguments(parser)
+    add_timing_arguments(parser)
+
+    args = parser.parse_args()
+    file_keys = get_file_keys(parser, args)
+
+    with instrument(args):
+        try:
+            # Load token
+            token = get_token()
+
+            if len(file_keys) == 1:
+                analyze_file(file_keys[0], args, token, Path(args.out), sys.stdout)
+            elif run_batch(
+                file_keys,
+                lambda file_key, out: analyze_file(file_key, args, token, Path(args.out) / safe_filename(file_key), out),
+                args.jobs,
+            ):
+                sys.exit(1)
+
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
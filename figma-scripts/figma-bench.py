@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from figma_fake_server import SyntheticFile, add_server_arguments, server_options, start_server
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FILE_KEY = 'BENCH'
+
+# Scenario name -> script and arguments; {out} is a fresh output directory, {frames} a node ID list
+SCENARIOS = {
+    'file': ['figma-file.py', FILE_KEY, '--depth', '3'],
+    'file-ndjson': ['figma-file.py', FILE_KEY, '--depth', '1000', '--format', 'ndjson'],
+    'styles': ['figma-styles.py', FILE_KEY],
+    'styles-stream': ['figma-styles.py', FILE_KEY, '--stream'],
+    'styles-incremental': ['figma-styles.py', FILE_KEY, '--incremental'],
+    'components': ['figma-components.py', FILE_KEY],
+    'components-full': ['figma-components.py', FILE_KEY, '--full-document'],
+    'frames': ['figma-frames.py', FILE_KEY, '--node-ids', '{frames}', '--out', '{out}'],
+    'frames-discover': ['figma-frames.py', FILE_KEY, '--out', '{out}'],
+    'analyze': ['figma-analyze.py', FILE_KEY, '--depth', '3', '--out', '{out}'],
+}
+
+# Metrics compared against a baseline, with the key in each result
+METRICS = (('wall_seconds', 'wall time'), ('peak_rss_bytes', 'peak RSS'), ('requests', 'requests'), ('bytes', 'bytes'))
+
+
+def frame_ids(synthetic, count):
+    """Return up to count top-level frame IDs, taken round-robin across pages."""
+    per_page = [[f"{page}:{j}" for j in synthetic.children(0)] for page in range(1, synthetic.pages + 1)]
+    ids = []
+    for row in zip(*per_page):
+        ids.extend(row)
+    return ids[:count]
+
+
+def run_script(argv, env):
+    """Run one script; return (wall seconds, peak RSS bytes, exit code, stderr tail)."""
+    with tempfile.TemporaryFile() as err:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable] + argv, cwd=SCRIPT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=err
+        )
+        # wait4 gives this child's own resource usage
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        err.seek(0)
+        stderr = err.read().decode('utf-8', errors='replace').strip()
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return wall, peak_rss, proc.returncode, stderr.splitlines()[-1] if stderr else ''
+
+
+def run_scenario(server, name, repeat, frames, warm):
+    """Run a scenario repeat times against the fake server and summarise the runs."""
+    walls = []
+    peak_rss = 0
+    stats = {}
+    with tempfile.TemporaryDirectory(prefix='figma-bench-') as workdir:
+        env = dict(
+            os.environ,
+            FIGMA_API_BASE=server.base_url,
+            FIGMA_ACCESS_TOKEN='bench',
+            FIGMA_CACHE_DIR=os.path.join(workdir, 'cache'),
+            # Measure the scripts themselves, never a daemon left running
+            FIGMA_NO_DAEMON='1',
+        )
+        for run in range(repeat + (1 if warm else 0)):
+            if not warm:
+                # Every measured run starts cold
+                env['FIGMA_CACHE_DIR'] = os.path.join(workdir, f'cache-{run}')
+            argv = [
+                arg.format(out=os.path.join(workdir, f'out-{run}'), frames=frames)
+                for arg in SCENARIOS[name]
+            ]
+            server.reset_stats()
+            wall, rss, code, error = run_script(argv, env)
+            if code != 0:
+                return {'scenario': name, 'status': 'failed', 'error': error or f'exit code {code}'}
+            if warm and run == 0:
+                continue
+            walls.append(wall)
+            peak_rss = max(peak_rss, rss)
+            stats = server.snapshot_stats()
+
+    return {
+        'scenario': name,
+        'status': 'ok',
+        'wall_seconds': round(statistics.median(walls), 4),
+        'wall_min_seconds': round(min(walls), 4),
+        'peak_rss_bytes': peak_rss,
+        'requests': stats['api_requests'],
+        'throttled': stats['throttled'],
+        'bytes': stats['bytes_sent'],
+        'connections': stats['connections'],
+    }
+
+
+def print_results(results):
+    """Print results as a table."""
+    print(f"{'Scenario':<20} {'Wall (s)':>9} {'Peak RSS (MiB)':>15} {'Requests':>9} {'429s':>5} {'Bytes':>14}")
+    print("-" * 80)
+    for result in results:
+        if result['status'] != 'ok':
+            print(f"{result['scenario']:<20} FAILED: {result['error']}")
+            continue
+        print(
+            f"{result['scenario']:<20} {result['wall_seconds']:>9.3f} {result['peak_rss_bytes'] / 1048576:>15.1f} "
+            f"{result['requests']:>9,} {result['throttled']:>5,} {result['bytes']:>14,}"
+        )
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a description of every metric that got worse than the baseline by more than tolerance."""
+    previous = {result['scenario']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result['scenario'])
+        if old is None or old.get('status') != 'ok':
+            continue
+        if result['status'] != 'ok':
+            regressions.append(f"{result['scenario']}: failed ({result['error']})")
+            continue
+        for key, label in METRICS:
+            if old[key] and result[key] > old[key] * (1 + tolerance):
+                change = (result[key] / old[key] - 1) * 100
+                regressions.append(f"{result['scenario']}: {label} {old[key]:,} -> {result[key]:,} (+{change:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the figma-scripts against a local stand-in Figma API server'
+    )
+    add_server_arguments(parser)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'Comma-separated scenarios to run (default: all of {", ".join(SCENARIOS)})')
+    parser.add_argument('--repeat', type=int, default=3, help='Measured runs per scenario; wall time is the median (default: 3)')
+    parser.add_argument('--warm', action='store_true', help='Do an unmeasured run first and keep its cache, instead of starting every run cold')
+    parser.add_argument('--frames', type=int, default=50, help='Number of frames exported by the frames scenario (default: 50)')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+    parser.add_argument('--baseline', help='Results JSON from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown before a metric counts as a regression (default: 0.25)')
+
+    args = parser.parse_args()
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    try:
+        synthetic = SyntheticFile(args.nodes, args.pages, args.fanout)
+        server = start_server(synthetic, **server_options(args))
+        config = {
+            'nodes': synthetic.node_count, 'pages': synthetic.pages, 'fanout': synthetic.fanout,
+            'latency': args.latency, 'throttle_every': args.throttle_every, 'compression': not args.no_compression,
+            'drop_every': args.drop_every, 'stall_every': args.stall_every,
+            'repeat': args.repeat, 'warm': args.warm,
+        }
+        print(f"Synthetic file: {synthetic.node_count:,} nodes, {synthetic.pages} page(s), fanout {synthetic.fanout}")
+        print(f"Latency: {args.latency}s, 429 every {args.throttle_every or 'never'}, {args.repeat} run(s) each{' (warm)' if args.warm else ''}")
+        print()
+
+        # Serialise the full document up front so no scenario pays for it
+        server.full_document()
+        if not args.no_compression:
+            server.full_document(gzipped=True)
+        frames = ','.join(frame_ids(synthetic, args.frames))
+        results = []
+        try:
+            for name in scenarios:
+                print(f"Running {name}...", file=sys.stderr, flush=True)
+                results.append(run_scenario(server, name, args.repeat, frames, args.warm))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        print_results(results)
+
+        if args.json_path:
+            with open(args.json_path, 'w', encoding='utf-8') as f:
+                json.dump({'config': config, 'results': results}, f, indent=2)
+                f.write('\n')
+
+        failed = any(result['status'] != 'ok' for result in results)
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get('config') != config:
+                print("\nWarning: baseline was recorded with different settings", file=sys.stderr)
+            regressions = compare_to_baseline(results, baseline, args.tolerance)
+            print()
+            if regressions:
+                print(f"REGRESSIONS (tolerance {args.tolerance:.0%}):")
+                for regression in regressions:
+                    print(f"  ✗ {regression}")
+                failed = True
+            else:
+                print(f"No regressions against {args.baseline}")
+
+        if failed:
+            sys.exit(1)
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,148 +1,170 @@
 #!/usr/bin/env python3
 import argparse
-import json
-import os
+import contextlib
 import sys
-import urllib.request
-import urllib.error
 from pathlib import Path
 
+from figma_batch import add_batch_arguments, get_file_keys, run_batch
+from figma_cache import add_cache_arguments, fetch_file_document, open_file_document
+from figma_client import API_BASE, fetch_published, get_token, iter_nodes, make_figma_request
+from figma_compact import TREE_FIELDS
+from figma_daemon import run_in_daemon
+from figma_index import indexed_file, open_index, page_names_for
+from figma_reports import write_components_report
+from figma_stream import NodeStream, walk_stream
+from figma_sync import sync_pages
+from figma_timings import add_timing_arguments, instrument
+from figma_tree import PageLocator, TypeCollector, build_node_index, walk
 
-def load_env_token(env_path):
-    """Load FIGMA_ACCESS_TOKEN from .env file."""
-    try:
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip().strip('"').strip("'")
-                        if key == 'FIGMA_ACCESS_TOKEN':
-                            return value
-        raise ValueError("FIGMA_ACCESS_TOKEN not found in .env file")
-    except FileNotFoundError:
-        raise FileNotFoundError(f".env file not found at {env_path}")
 
+def resolve_pages_lazily(file_key, components, token, concurrency):
+    """Resolve component pages without downloading the full document.
 
-def make_figma_request(url, token):
-    """Make authenticated request to Figma API."""
-    headers = {
-        'X-Figma-Token': token
+    Uses containing_frame metadata first, then a depth=1 page listing, then
+    shallow and finally full page subtrees from the nodes endpoint, stopping
+    as soon as every component is placed. Returns (file_data, page_names).
+    """
+    file_data = make_figma_request(f"{API_BASE}/files/{file_key}?depth=1", token)
+    pages = {
+        page.get('id'): page.get('name', 'Unknown Page')
+        for page in (file_data.get('document') or {}).get('children', [])
+        if page.get('type') == 'CANVAS'
     }
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read().decode('utf-8', errors='replace'))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8', errors='replace')
-        raise Exception(f"HTTP {e.code}: {error_body}")
-    except urllib.error.URLError as e:
-        raise Exception(f"URL Error: {e.reason}")
-
-
-def find_node_by_id(node, target_id):
-    """Recursively find a node by its ID."""
-    if node.get('id') == target_id:
-        return node
     
-    if 'children' in node:
-        for child in node['children']:
-            result = find_node_by_id(child, target_id)
-            if result:
-                return result
+    page_names = {}
+    # Component IDs still to place, with their containing frame ID as a fallback
+    pending = {}
+    for comp_data in components:
+        node_id = comp_data.get('node_id', '')
+        containing_frame = comp_data.get('containing_frame') or {}
+        if 'pageName' in containing_frame:
+            page_names[node_id] = containing_frame['pageName']
+        elif containing_frame.get('pageId') in pages:
+            page_names[node_id] = pages[containing_frame['pageId']]
+        else:
+            pending[node_id] = containing_frame.get('nodeId')
+    
+    # Shallow pass catches components at or near the top level of a page,
+    # then whole pages are fetched until everything is resolved
+    for depth in (2, None):
+        if not pending:
+            break
+        for batch in iter_nodes(file_key, pages, token, depth=depth, concurrency=concurrency):
+            for page_document in batch.values():
+                if not page_document:
+                    continue
+                node_index = build_node_index(page_document)
+                for node_id, frame_id in list(pending.items()):
+                    location = node_index.get(node_id) or node_index.get(frame_id)
+                    if location and location.page:
+                        page_names[node_id] = location.page
+                        del pending[node_id]
+            if not pending:
+                break
     
-    return None
+    return file_data, page_names
+
+
+def stream_component_pages(file_key, components, token, use_cache, refresh):
+    """Resolve component pages from an incrementally parsed full document.
 
+    Returns (file_data, page_names); file_data holds only the top-level metadata.
+    """
+    locator = PageLocator(comp_data.get('node_id') for comp_data in components)
+    with open_file_document(file_key, token, use_cache=use_cache, refresh=refresh) as f:
+        stream = NodeStream(f)
+        walk_stream(stream, [locator])
+    return stream.meta, locator.pages
 
-def find_page_for_node(document, node_id):
-    """Find which page contains a given node."""
-    if 'children' in document:
-        for page in document['children']:
-            if page.get('type') == 'CANVAS':
-                result = find_node_by_id(page, node_id)
-                if result:
-                    return page.get('name', 'Unknown Page')
-    return 'Unknown Page'
+
+def extract_component_ids(page_document):
+    """Return the IDs of all components on a page."""
+    collector = TypeCollector(['COMPONENT'])
+    walk(page_document, [collector])
+    return collector.ids
+
+
+def list_components(file_key, args, token, out):
+    """List the components of one file."""
+    # Get components
+    components = fetch_published(file_key, 'components', token)
+    
+    if args.from_index:
+        with contextlib.closing(open_index()) as conn:
+            file_data = indexed_file(conn, file_key)
+            page_names = page_names_for(conn, file_key, (c.get('node_id', '') for c in components))
+    elif args.incremental:
+        file_data, page_results = sync_pages(
+            file_key, token, 'components', extract_component_ids, args.concurrency, refresh=args.refresh
+        )
+        page_names = {
+            node_id: page_name
+            for _, page_name, node_ids in page_results
+            for node_id in node_ids
+        }
+    elif args.full_document and args.stream:
+        file_data, page_names = stream_component_pages(
+            file_key, components, token, not args.no_cache, args.refresh
+        )
+    elif args.full_document:
+        # Get file data to find pages
+        file_data = fetch_file_document(
+            file_key, token, use_cache=not args.no_cache, refresh=args.refresh, fields=TREE_FIELDS
+        )
+        document = file_data.get('document')
+        # One walk up front instead of a full rescan per component
+        locator = PageLocator(comp_data.get('node_id') for comp_data in components)
+        if document:
+            walk(document, [locator])
+        page_names = locator.pages
+    else:
+        file_data, page_names = resolve_pages_lazily(file_key, components, token, args.concurrency)
+    
+    write_components_report(out, file_key, file_data, components, page_names)
 
 
 def main():
+    # Hand the command to a running figma-daemon.py, if any
+    status = run_in_daemon(__file__)
+    if status is not None:
+        sys.exit(status)
+    
     parser = argparse.ArgumentParser(
         description='List components from Figma file'
     )
-    parser.add_argument('file_key', help='Figma file key')
+    parser.add_argument('--full-document', action='store_true', help='Download the whole file to resolve pages instead of fetching only what is missing')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallel page lookups when resolving pages (default: 4)')
+    parser.add_argument('--stream', action='store_true', help='With --full-document, parse the document incrementally instead of loading it into memory')
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='Resolve pages from per-page snapshots, re-reading only pages that changed since the last incremental run '
+             '(a new file version still downloads every page to compare it)'
+    )
+    parser.add_argument('--from-index', action='store_true', help='Resolve pages from the local node index built by figma-index.py')
+    add_cache_arguments(parser)
+    add_batch_arguments(parser)
+    add_timing_arguments(parser)
     
     args = parser.parse_args()
+    file_keys = get_file_keys(parser, args)
+    if (args.stream or args.no_cache) and not args.full_document:
+        parser.error('--stream and --no-cache require --full-document')
+    if args.refresh and not (args.full_document or args.incremental):
+        parser.error('--refresh requires --full-document or --incremental')
     
-    try:
-        # Load token
-        env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
-        token = load_env_token(env_path)
-        
-        # Get components
-        url = f"https://api.figma.com/v1/files/{args.file_key}/components"
-        components_data = make_figma_request(url, token)
-        
-        # Get file data to find pages
-        file_url = f"https://api.figma.com/v1/files/{args.file_key}"
-        file_data = make_figma_request(file_url, token)
-        
-        document = file_data.get('document')
-        
-        # Extract components
-        meta = components_data.get('meta', {})
-        components = meta.get('components', {})
-        
-        print("=" * 80)
-        print(f"COMPONENTS FROM: {file_data.get('name', 'Unknown')}")
-        print(f"Key: {args.file_key}")
-        print(f"Total Components: {len(components)}")
-        print("=" * 80)
-        print()
-        
-        if not components:
-            print("No components found in this file")
-            return
-        
-        # Print each component (API returns a list)
-        if isinstance(components, list):
-            comp_iter = enumerate(components, 1)
-        else:
-            comp_iter = ((i, v) for i, (k, v) in enumerate(components.items(), 1))
-        for i, comp_data in comp_iter:
-            name = comp_data.get('name', 'Unnamed')
-            description = comp_data.get('description', '')
-            node_id = comp_data.get('node_id', '')
-            containing_frame = comp_data.get('containing_frame', {})
-            
-            # Try to find the page
-            page_name = 'Unknown Page'
-            if document:
-                page_name = find_page_for_node(document, node_id)
-            
-            # If we have containing_frame info, use that
-            if containing_frame and 'pageName' in containing_frame:
-                page_name = containing_frame['pageName']
-            
-            print(f"{i}. {name}")
-            print(f"   ID: {node_id}")
-            print(f"   Node ID: {node_id}")
-            print(f"   Page: {page_name}")
-            
-            if description:
-                print(f"   Description: {description}")
+    with instrument(args):
+        try:
+            # Load token
+            token = get_token()
             
-            if containing_frame:
-                frame_name = containing_frame.get('name', 'N/A')
-                if frame_name and frame_name != 'N/A':
-                    print(f"   Containing Frame: {frame_name}")
+            if len(file_keys) == 1:
+                list_components(file_keys[0], args, token, sys.stdout)
+            elif run_batch(file_keys, lambda file_key, out: list_components(file_key, args, token, out), args.jobs):
+                sys.exit(1)
             
-            print()
-        
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import signal
+import sys
+
+from figma_cache import configure_memory_cache
+from figma_daemon import SOCKET_PATH, request_daemon, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the figma-scripts from a resident process that keeps documents and connections warm'
+    )
+    parser.add_argument('--socket', default=SOCKET_PATH, help=f'Unix socket path (default: {SOCKET_PATH}, or FIGMA_DAEMON_SOCKET)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    start_parser = subparsers.add_parser('start', help='Serve in the foreground until stopped')
+    start_parser.add_argument('--max-entries', type=int, default=32, help='Parsed documents, listings and analysis results kept in memory (default: 32)')
+    start_parser.add_argument('--probe-ttl', type=float, default=10.0, help='Seconds a file version probe is trusted before asking again (default: 10)')
+    subparsers.add_parser('status', help='Show whether a daemon is running')
+    subparsers.add_parser('stop', help='Stop the running daemon')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'start':
+            configure_memory_cache(args.max_entries, args.probe_ttl)
+            server = serve(args.socket)
+            # Leave through serve_forever's normal exit so the socket file is removed
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            print(f"Figma daemon listening on {args.socket}", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+            print("Figma daemon stopped", file=sys.stderr)
+            return
+
+        reply = request_daemon({'command': args.command}, args.socket)
+        if reply is None:
+            print(f"No daemon listening on {args.socket}")
+            sys.exit(1)
+        if args.command == 'status':
+            print(json.dumps(reply, indent=2))
+        else:
+            print("Figma daemon stopping")
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
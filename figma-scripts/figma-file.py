@@ -1,104 +1,170 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
 import json
-import os
 import sys
-import urllib.request
-import urllib.error
 from pathlib import Path
 
+from figma_batch import add_batch_arguments, get_file_keys, run_batch
+from figma_cache import fetch_file_listing
+from figma_client import API_BASE, get_token, open_figma_request
+from figma_compact import TREE_FIELDS
+from figma_daemon import run_in_daemon
+from figma_expand import DEFAULT_MAX_NODES, DEFAULT_STEP, TreeExpander
+from figma_index import INDEX_PATH, indexed_file, iter_tree, open_index
+from figma_reports import write_file_header
+from figma_stream import NodeStream, walk_stream
+from figma_timings import add_timing_arguments, instrument, phase
+from figma_tree import NdjsonWriter, TreePrinter, buffered_stdout, print_tree, skip_hidden, walk
 
-def load_env_token(env_path):
-    """Load FIGMA_ACCESS_TOKEN from .env file."""
-    try:
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip().strip('"').strip("'")
-                        if key == 'FIGMA_ACCESS_TOKEN':
-                            return value
-        raise ValueError("FIGMA_ACCESS_TOKEN not found in .env file")
-    except FileNotFoundError:
-        raise FileNotFoundError(f".env file not found at {env_path}")
 
-
-def make_figma_request(url, token):
-    """Make authenticated request to Figma API."""
-    headers = {
-        'X-Figma-Token': token
-    }
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read().decode('utf-8', errors='replace'))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8', errors='replace')
-        raise Exception(f"HTTP {e.code}: {error_body}")
-    except urllib.error.URLError as e:
-        raise Exception(f"URL Error: {e.reason}")
+def print_indexed_tree(out, file_key, max_depth, output_format, hide_invisible):
+    """Print the tree from the local node index instead of the API."""
+    with contextlib.closing(open_index(INDEX_PATH)) as conn:
+        data = indexed_file(conn, file_key)
+        if output_format == 'text':
+            write_file_header(out, file_key, data)
+            out.write("DOCUMENT STRUCTURE:\n\n")
+            writer = TreePrinter(out=out)
+        else:
+            writer = NdjsonWriter(out)
+        # Rows come in document order, so a hidden node's subtree is every
+        # following row deeper than it
+        hidden_depth = None
+        for node in iter_tree(conn, file_key, max_depth=max_depth):
+            depth = node['depth']
+            if hidden_depth is not None and depth > hidden_depth:
+                continue
+            hidden_depth = None
+            if hide_invisible and not node['visible']:
+                hidden_depth = depth
+                continue
+            record = {'id': node['id'], 'name': node['name'], 'type': node['type']}
+            if not node['visible']:
+                record['visible'] = False
+            parent = [{'id': node['parent_id']}] if node['parent_id'] else []
+            writer.enter(record, depth, parent, node['ord'])
 
 
-def print_tree(node, indent=0, show_type=True):
-    """Recursively print node tree."""
-    prefix = "  " * indent
-    node_id = node.get('id', 'N/A')
-    node_type = node.get('type', 'UNKNOWN')
-    node_name = node.get('name', 'Unnamed')
+def print_file(file_key, args, token, out):
+    """Print the structure of one file in the requested format."""
+    if args.from_index:
+        print_indexed_tree(out, file_key, args.depth, args.format, args.skip_hidden)
+        return
+    
+    prune = skip_hidden if args.skip_hidden else None
+    # The text tree only needs each node's id, name and type
+    fields = TREE_FIELDS if args.format == 'text' else None
+    expander = None
     
-    if show_type:
-        print(f"{prefix}├─ [{node_type}] {node_name} (id: {node_id})")
+    if args.expand:
+        expander = TreeExpander(
+            file_key, token, max_depth=args.depth, page=args.page, name=args.name,
+            max_nodes=DEFAULT_MAX_NODES if args.max_nodes is None else args.max_nodes,
+            step=args.step or DEFAULT_STEP, concurrency=args.concurrency, prune=prune, fields=fields,
+        )
+        data = expander.run()
+    elif args.format == 'ndjson':
+        # Emit nodes while the response is still arriving
+        url = f"{API_BASE}/files/{file_key}?depth={args.depth}"
+        with open_figma_request(url, token) as response:
+            walk_stream(NodeStream(response), [NdjsonWriter(out)], prune=prune)
+        return
     else:
-        print(f"{prefix}├─ {node_name} (id: {node_id})")
+        # Make API request
+        data = fetch_file_listing(file_key, token, args.depth, fields=fields)
+    
+    document = data.get('document')
+    with phase('output'):
+        if args.format == 'json':
+            json.dump(data, out, ensure_ascii=False)
+            out.write('\n')
+        elif args.format == 'ndjson':
+            if document:
+                walk(document, [NdjsonWriter(out)], prune=prune)
+        else:
+            # Print file information
+            write_file_header(out, file_key, data)
+            
+            # Print document tree
+            if document:
+                out.write("DOCUMENT STRUCTURE:\n\n")
+                print_tree(document, prune=prune, out=out)
+            else:
+                out.write("No document data found\n")
     
-    # Print children if they exist
-    if 'children' in node:
-        for child in node['children']:
-            print_tree(child, indent + 1, show_type)
+    if expander is not None:
+        summary = f"Expanded {expander.expanded:,} subtree(s) in {expander.rounds} round(s): {expander.node_count:,} node(s)"
+        if expander.unexpanded:
+            summary += f"; node budget reached with {expander.unexpanded:,} subtree(s) left closed"
+        if args.format == 'text':
+            out.write(f"\n{summary}\n")
+        else:
+            # Keep machine-readable output clean
+            print(summary, file=sys.stderr)
 
 
 def main():
+    # Hand the command to a running figma-daemon.py, if any
+    status = run_in_daemon(__file__)
+    if status is not None:
+        sys.exit(status)
+    
     parser = argparse.ArgumentParser(
         description='Get Figma file structure and print tree of pages, frames, and layers'
     )
-    parser.add_argument('file_key', help='Figma file key')
-    parser.add_argument('--depth', type=int, default=2, help='Depth of tree to fetch (default: 2)')
+    parser.add_argument('--depth', type=int, help='Depth of tree to fetch (default: 2; with --expand, no limit)')
+    parser.add_argument('--skip-hidden', action='store_true', help='Leave invisible layers and their children out of the tree (text and ndjson)')
+    parser.add_argument(
+        '--format', choices=['text', 'json', 'ndjson'], default='text',
+        help='Output format: text tree, the raw JSON response, or one JSON node per line streamed '
+             'as the response is parsed, children before parents (default: text)'
+    )
+    parser.add_argument('--from-index', action='store_true', help='Print the tree from the local node index built by figma-index.py (text and ndjson)')
+    parser.add_argument(
+        '--expand', action='store_true',
+        help='Start from the page listing and fetch only the selected subtrees, a few levels per request, '
+             'down to --depth or until --max-nodes'
+    )
+    parser.add_argument('--page', help='With --expand: only open the page with this name')
+    parser.add_argument('--name', help='With --expand: below the pages, only open nodes whose name matches this glob, e.g. "Checkout*"')
+    parser.add_argument('--max-nodes', type=int, help=f'With --expand: stop once about this many nodes are fetched; the first round of pages can overshoot it (0 for no limit, default: {DEFAULT_MAX_NODES})')
+    parser.add_argument('--step', type=int, help=f'With --expand: levels fetched per request (default: {DEFAULT_STEP})')
+    parser.add_argument('--concurrency', type=int, default=4, help='With --expand: parallel node batch requests (default: 4)')
+    add_batch_arguments(parser)
+    add_timing_arguments(parser)
     
     args = parser.parse_args()
+    file_keys = get_file_keys(parser, args)
+    if args.from_index and args.format == 'json':
+        parser.error('--from-index supports --format text or ndjson')
+    if args.expand and args.from_index:
+        parser.error('--expand and --from-index cannot be combined')
+    if not args.expand and any(value is not None for value in (args.page, args.name, args.max_nodes, args.step)):
+        parser.error('--page, --name, --max-nodes and --step require --expand')
+    if args.depth is None and not args.expand:
+        args.depth = 2
     
-    try:
-        # Load token
-        env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
-        token = load_env_token(env_path)
-        
-        # Make API request
-        url = f"https://api.figma.com/v1/files/{args.file_key}?depth={args.depth}"
-        data = make_figma_request(url, token)
-        
-        # Print file information
-        print("=" * 80)
-        print(f"FILE: {data.get('name', 'Unknown')}")
-        print(f"Key: {args.file_key}")
-        print(f"Last Modified: {data.get('lastModified', 'N/A')}")
-        print(f"Version: {data.get('version', 'N/A')}")
-        print("=" * 80)
-        print()
-        
-        # Print document tree
-        document = data.get('document')
-        if document:
-            print("DOCUMENT STRUCTURE:")
-            print()
-            print_tree(document)
-        else:
-            print("No document data found")
-        
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+    with instrument(args):
+        out = buffered_stdout()
+        try:
+            # Load token (the index needs none)
+            token = None if args.from_index else get_token()
+            
+            if len(file_keys) == 1:
+                print_file(file_keys[0], args, token, out)
+            elif run_batch(file_keys, lambda file_key, file_out: print_file(file_key, args, token, file_out), args.jobs, out=out):
+                sys.exit(1)
+            
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            try:
+                out.flush()
+            except BrokenPipeError:
+                # Reader (e.g. head) went away; nothing left to report
+                pass
 
 
 if __name__ == '__main__':
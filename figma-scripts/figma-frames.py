@@ -1,59 +1,190 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import contextlib
+import fnmatch
+import functools
+import hashlib
+import http.client
 import os
+import re
 import sys
-import urllib.request
-import urllib.error
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
+from figma_batch import add_batch_arguments, get_file_keys, run_batch
+from figma_cache import probe_version
+from figma_client import (
+    API_BASE, RETRY_CODES, FigmaAPIError, FigmaConnectionError, backoff_delay, fetch_nodes, get_token,
+    make_figma_request, open_figma_request, open_url,
+)
+from figma_daemon import run_in_daemon
+from figma_export import ExportManifest
+from figma_index import INDEX_PATH, indexed_file, open_index, query_nodes
+from figma_stream import NodeStream
+from figma_sync import page_hash
+from figma_timings import add_timing_arguments, get_timings, instrument, phase
+from figma_tree import skip_hidden
 
-def load_env_token(env_path):
-    """Load FIGMA_ACCESS_TOKEN from .env file."""
-    try:
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip().strip('"').strip("'")
-                        if key == 'FIGMA_ACCESS_TOKEN':
-                            return value
-        raise ValueError("FIGMA_ACCESS_TOKEN not found in .env file")
-    except FileNotFoundError:
-        raise FileNotFoundError(f".env file not found at {env_path}")
-
-
-def make_figma_request(url, token):
-    """Make authenticated request to Figma API."""
-    headers = {
-        'X-Figma-Token': token
-    }
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read().decode('utf-8', errors='replace'))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8', errors='replace')
-        raise Exception(f"HTTP {e.code}: {error_body}")
-    except urllib.error.URLError as e:
-        raise Exception(f"URL Error: {e.reason}")
+
+CHUNK_SIZE = 64 * 1024
+# Keep render URLs well below common URL length limits
+MAX_IDS_PARAM_LENGTH = 1500
+# Errors where splitting a batch cannot help: auth failures, and statuses
+# make_figma_request has already retried (rate limits, server errors)
+NO_SPLIT_CODES = (401, 403) + RETRY_CODES
+# Seconds an image download may go without receiving data, and attempts after the first
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_RETRIES = 5
+
+
+class IncompleteDownload(Exception):
+    """A download ended before the advertised length."""
+
+
+# Download failures worth another attempt; HTTP errors are decided by status
+RETRYABLE_DOWNLOAD_ERRORS = (OSError, http.client.HTTPException, FigmaConnectionError, IncompleteDownload)
 
 
-def download_file(url, output_path):
-    """Download file from URL to output path."""
+def parse_content_range(value):
+    """Return (start, total) from a 'bytes start-end/total' header; total is None when unknown."""
+    match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', value or '')
+    if not match:
+        return None, None
+    return int(match.group(1)), None if match.group(2) == '*' else int(match.group(2))
+
+
+def download_file(url, output_path, timeout=DOWNLOAD_TIMEOUT, retries=DOWNLOAD_RETRIES):
+    """Stream file from URL to output path through a temporary .part file.
+
+    An attempt gives up after timeout seconds without data. Dropped
+    connections, timeouts, truncated bodies, 429s and 5xx responses are
+    retried with jittered exponential backoff, resuming from the end of the
+    .part file with a Range request (or starting over if the server ignores
+    it). The size is checked against Content-Length before the rename.
+
+    Returns the sha256 hex digest of the downloaded file.
+    """
+    output_path = Path(output_path)
+    part_path = output_path.with_name(output_path.name + '.part')
+    timings = get_timings()
+    digest = hashlib.sha256()
+    received = 0
     try:
-        with urllib.request.urlopen(url) as response:
-            data = response.read()
-            with open(output_path, 'wb') as f:
-                f.write(data)
-        return True
+        with open(part_path, 'wb') as f:
+            for attempt in range(retries + 1):
+                headers = {'Accept-Encoding': 'identity'}
+                if received:
+                    headers['Range'] = f"bytes={received}-"
+                try:
+                    with open_url(url, headers, timeout) as response:
+                        length = response.getheader('Content-Length')
+                        expected = int(length) if length and not response.encoding else None
+                        if response.status == 206:
+                            start, total = parse_content_range(response.getheader('Content-Range'))
+                            if start != received:
+                                message = f"server resumed at byte {start}, not {received}"
+                                f.seek(0)
+                                f.truncate()
+                                digest, received = hashlib.sha256(), 0
+                                raise IncompleteDownload(message)
+                            timings.count('download_resumes')
+                            if total is not None:
+                                expected = total
+                            elif expected is not None:
+                                expected += received
+                        elif received:
+                            # The server ignored the range; start over
+                            f.seek(0)
+                            f.truncate()
+                            digest, received = hashlib.sha256(), 0
+                        while True:
+                            chunk = response.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            digest.update(chunk)
+                            received += len(chunk)
+                    # http.client ends a body cut short by the server without an error
+                    if expected is not None and received != expected:
+                        raise IncompleteDownload(f"received {received:,} of {expected:,} bytes")
+                    break
+                except FigmaAPIError as e:
+                    retryable = e.status in RETRY_CODES or (e.status == 416 and received)
+                    if not retryable or attempt == retries:
+                        raise
+                    if e.status == 416:
+                        # Nothing left to send for our range, so the .part file is suspect
+                        f.seek(0)
+                        f.truncate()
+                        digest, received = hashlib.sha256(), 0
+                        delay = 0
+                    else:
+                        delay = e.retry_after if e.retry_after is not None else backoff_delay(attempt)
+                except RETRYABLE_DOWNLOAD_ERRORS:
+                    if attempt == retries:
+                        raise
+                    delay = backoff_delay(attempt)
+                timings.count('download_retries')
+                time.sleep(delay)
+        # Atomic rename so a failed download never leaves a truncated image behind
+        os.replace(part_path, output_path)
+        return digest.hexdigest()
     except Exception as e:
+        part_path.unlink(missing_ok=True)
         raise Exception(f"Download failed: {e}")
 
 
+def chunk_node_ids(node_ids, chunk_size):
+    """Split node IDs into render batches bounded by count and URL length.
+
+    Batches are yielded as soon as they fill, so node_ids may be a generator.
+    """
+    current = []
+    length = 0
+    for node_id in node_ids:
+        if current and (len(current) >= chunk_size or length + len(node_id) + 1 > MAX_IDS_PARAM_LENGTH):
+            yield current
+            current = []
+            length = 0
+        current.append(node_id)
+        length += len(node_id) + 1
+    if current:
+        yield current
+
+
+def render_chunk(file_key, node_ids, token, export_format, scale):
+    """Render one batch of nodes, splitting it in half when Figma rejects it.
+
+    Returns (images, errors). A node that cannot be rendered (a 400 or a
+    render timeout) only fails itself instead of the whole batch; network
+    failures and exhausted retries fail the whole batch at once, since
+    smaller requests would only meet the same failure.
+    """
+    url = f"{API_BASE}/images/{file_key}?ids={','.join(node_ids)}&format={export_format}"
+    if export_format == 'png':
+        url += f"&scale={scale}"
+    
+    try:
+        data = make_figma_request(url, token)
+        if 'err' in data and data['err']:
+            raise Exception(f"API Error: {data['err']}")
+        return data.get('images', {}), {}
+    except Exception as e:
+        splittable = not (
+            isinstance(e, FigmaConnectionError) or (isinstance(e, FigmaAPIError) and e.status in NO_SPLIT_CODES)
+        )
+        if len(node_ids) == 1 or not splittable:
+            return {}, {node_id: str(e) for node_id in node_ids}
+    
+    middle = len(node_ids) // 2
+    images, errors = render_chunk(file_key, node_ids[:middle], token, export_format, scale)
+    more_images, more_errors = render_chunk(file_key, node_ids[middle:], token, export_format, scale)
+    images.update(more_images)
+    errors.update(more_errors)
+    return images, errors
+
+
 def sanitize_filename(name):
     """Sanitize string for use as filename."""
     # Replace invalid filename characters
@@ -63,83 +194,308 @@ def sanitize_filename(name):
     return name
 
 
+def output_filename(node_id, export_format):
+    """Return the image filename for a node."""
+    return f"{sanitize_filename(node_id)}.{export_format}"
+
+
+def discover_frames(file_key, token, node_type='FRAME', page=None, name=None):
+    """Yield the IDs of matching top-level nodes while a depth=2 listing of the file is parsed.
+
+    Top-level nodes are the direct children of pages. page selects a page by
+    name and name is a glob matched against the node name; hidden nodes are
+    left out.
+    """
+    url = f"{API_BASE}/files/{file_key}?depth=2"
+    with open_figma_request(url, token) as response:
+        for item in NodeStream(response):
+            if len(item.ancestors) != 2:
+                continue
+            node, page_node = item.node, item.ancestors[1]
+            if page_node.get('type') != 'CANVAS' or skip_hidden(node):
+                continue
+            if node_type and node.get('type') != node_type:
+                continue
+            if page is not None and page_node.get('name') != page:
+                continue
+            if name is not None and not fnmatch.fnmatchcase(node.get('name', ''), name):
+                continue
+            yield node.get('id')
+
+
+def plan_chunk(file_key, version, node_ids, token, manifest, export_format, scale, force=False):
+    """Split a batch of node IDs into those that need rendering and those whose image is current.
+
+    A node is current when its image on disk matches the manifest and either
+    the file version is unchanged or its subtree hash is. Returns (changes,
+    skipped, refreshed, error): changes maps node ID to (status, node_hash)
+    with status 'new' or 'changed', and refreshed lists (node_id, node_hash,
+    entry) for skipped nodes whose entry should be recorded at the new
+    version. If the nodes cannot be fetched for hashing, error holds the
+    exception and they are all rendered with no hash, to be hashed on the
+    next run. The manifest is only read, so this can run on a worker thread.
+    """
+    with phase('plan'):
+        skipped = []
+        # Nodes whose subtree hash is needed, with their intact manifest entry if any
+        to_hash = {}
+        for node_id in node_ids:
+            entry = None if force else manifest.intact_entry(output_filename(node_id, export_format), scale)
+            if entry and version and entry.get('version') == version:
+                skipped.append(node_id)
+            else:
+                to_hash[node_id] = entry
+        
+        hashes = {}
+        error = None
+        if to_hash:
+            try:
+                hashes = {
+                    node_id: page_hash(document) if document else None
+                    for node_id, document in fetch_nodes(file_key, list(to_hash), token).items()
+                }
+            except Exception as e:
+                # One failed lookup must not sink the export; render without a hash
+                error = e
+        
+        changes = {}
+        refreshed = []
+        for node_id, entry in to_hash.items():
+            filename = output_filename(node_id, export_format)
+            node_hash = hashes.get(node_id)
+            if entry and node_hash and entry.get('hash') == node_hash:
+                # New file version, same node: keep the image and note the version
+                refreshed.append((node_id, node_hash, entry))
+                skipped.append(node_id)
+            else:
+                status = 'changed' if filename in manifest.entries else 'new'
+                changes[node_id] = (status, node_hash)
+        return changes, skipped, refreshed, error
+
+
+def render_batch(file_key, node_ids, token, export_format, scale):
+    with phase('render'):
+        return render_chunk(file_key, node_ids, token, export_format, scale)
+
+
+def download_image(url, output_path, timeout=DOWNLOAD_TIMEOUT, retries=DOWNLOAD_RETRIES):
+    with phase('download'):
+        return download_file(url, output_path, timeout, retries)
+
+
+class FrameExporter:
+    """Pipelined export of one file's nodes into a directory.
+
+    Node IDs are taken in render-sized batches as they arrive (e.g. while
+    the discovery listing is still being parsed). Each batch is planned
+    against the export manifest, rendered and its images downloaded on a
+    shared worker pool, so discovery, rendering and downloading overlap.
+    The calling thread hands work between the stages and is the only one
+    that updates the manifest and writes output.
+    """
+
+    def __init__(self, file_key, args, token, output_dir, manifest, version, out):
+        self.file_key = file_key
+        self.args = args
+        self.token = token
+        self.output_dir = output_dir
+        self.manifest = manifest
+        self.version = version
+        self.out = out
+        self.scale = args.scale if args.format == 'png' else None
+        self.changes = {}
+        self.pending = {}
+        self.counts = {'nodes': 0, 'batches': 0, 'images': 0, 'skipped': 0, 'new': 0, 'changed': 0}
+
+    def run(self, node_ids):
+        """Export every node ID, returning once all downloads have finished."""
+        seen = set()
+        unique_ids = (node_id for node_id in node_ids if not (node_id in seen or seen.add(node_id)))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, self.args.concurrency))
+        try:
+            for chunk in chunk_node_ids(unique_ids, self.args.chunk_size):
+                self.counts['nodes'] += len(chunk)
+                self.submit(
+                    self.planned, plan_chunk, self.file_key, self.version, chunk, self.token,
+                    self.manifest, self.args.format, self.scale, force=self.args.force
+                )
+                self.handle_done()
+            while self.pending:
+                wait(self.pending, return_when=FIRST_COMPLETED)
+                self.handle_done()
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, handler, fn, *args, **kwargs):
+        future = self.executor.submit(fn, *args, **kwargs)
+        self.pending[future] = handler
+
+    def handle_done(self):
+        """Pass every finished stage's result on to its handler."""
+        for future in [future for future in self.pending if future.done()]:
+            handler = self.pending.pop(future)
+            handler(future)
+
+    def planned(self, future):
+        changes, skipped, refreshed, error = future.result()
+        if error is not None:
+            print(f"! Could not hash {len(changes)} node(s) ({error}); rendering them anyway", file=self.out, flush=True)
+        for node_id, node_hash, entry in refreshed:
+            self.manifest.record(
+                output_filename(node_id, self.args.format), node_id, self.version, node_hash, self.scale,
+                entry.get('sha256')
+            )
+        for node_id in skipped:
+            print(f"= {node_id} → {output_filename(node_id, self.args.format)} (unchanged, skipped)", file=self.out, flush=True)
+        self.counts['skipped'] += len(skipped)
+        if changes:
+            self.changes.update(changes)
+            self.counts['batches'] += 1
+            self.submit(
+                self.rendered, render_batch, self.file_key, list(changes), self.token, self.args.format, self.args.scale
+            )
+
+    def rendered(self, future):
+        images, errors = future.result()
+        for node_id, error in errors.items():
+            print(f"✗ {node_id}: Render failed: {error}", file=self.out, flush=True)
+        for node_id, image_url in images.items():
+            if node_id not in self.changes:
+                continue
+            self.counts['images'] += 1
+            if not image_url:
+                print(f"✗ {node_id}: No image URL returned (node may not exist or is not exportable)", file=self.out, flush=True)
+                continue
+            filename = output_filename(node_id, self.args.format)
+            self.submit(
+                functools.partial(self.downloaded, node_id=node_id, filename=filename), download_image, image_url,
+                self.output_dir / filename, self.args.download_timeout, self.args.download_retries
+            )
+
+    def downloaded(self, future, node_id, filename):
+        status, node_hash = self.changes[node_id]
+        try:
+            sha256 = future.result()
+            self.manifest.record(filename, node_id, self.version, node_hash, self.scale, sha256)
+            file_size = (self.output_dir / filename).stat().st_size
+            print(f"✓ {node_id} → {filename} ({file_size:,} bytes, {status})", file=self.out, flush=True)
+            self.counts[status] += 1
+        except Exception as e:
+            print(f"✗ {node_id}: {e}", file=self.out, flush=True)
+
+
+def export_frames(file_key, args, token, output_dir, out):
+    """Render the selected nodes of one file and download them into output_dir."""
+    # Parse node IDs
+    if args.node_ids:
+        node_ids = [nid.strip() for nid in args.node_ids.split(',')]
+        selection = f"{len(node_ids)} node(s)"
+    elif args.from_index:
+        with contextlib.closing(open_index(INDEX_PATH)) as conn:
+            indexed_file(conn, file_key)
+            rows = query_nodes(
+                conn, file_key, node_type=args.type, name=args.name, page=args.page, visible=True
+            )
+        node_ids = [row['id'] for row in rows]
+        if not node_ids:
+            raise Exception("No matching nodes in the index")
+        selection = f"{len(node_ids)} node(s)"
+    else:
+        # Discovered lazily, so rendering starts while the listing is still arriving
+        node_ids = discover_frames(file_key, token, args.type, args.page, args.name)
+        selection = f"top-level {args.type or 'all'} nodes"
+    
+    output_dir = Path(output_dir)
+    scale = args.scale if args.format == 'png' else None
+    manifest = ExportManifest(output_dir).load()
+    version, _ = probe_version(file_key, token)
+    
+    print(f"Exporting {selection} of {file_key} in batches of up to {args.chunk_size}...", file=out)
+    print(f"Format: {args.format}, Scale: {scale or 'N/A'}", file=out)
+    print(file=out)
+    
+    # Create output directory
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    print(f"Downloading to: {output_dir.resolve()}", file=out)
+    print("-" * 80, file=out)
+    
+    exporter = FrameExporter(file_key, args, token, output_dir, manifest, version, out)
+    try:
+        exporter.run(node_ids)
+    finally:
+        manifest.save()
+    
+    counts = exporter.counts
+    if not counts['nodes']:
+        raise Exception("No matching top-level nodes found")
+    if exporter.changes and not counts['images']:
+        raise Exception("No images returned from API")
+    
+    success = counts['new'] + counts['changed']
+    print("-" * 80, file=out)
+    print(f"Rendered {len(exporter.changes)} of {counts['nodes']} node(s) in {counts['batches']} batch(es)", file=out)
+    print(f"Downloaded {success}/{len(exporter.changes)} images successfully", file=out)
+    print(f"New: {counts['new']}, changed: {counts['changed']}, unchanged (skipped): {counts['skipped']}", file=out)
+
+
 def main():
+    # Hand the command to a running figma-daemon.py, if any
+    status = run_in_daemon(__file__)
+    if status is not None:
+        sys.exit(status)
+    
     parser = argparse.ArgumentParser(
         description='Download Figma frame images'
     )
-    parser.add_argument('file_key', help='Figma file key')
-    parser.add_argument('--node-ids', required=True, help='Comma-separated list of node IDs to export')
+    parser.add_argument('--node-ids', help='Comma-separated list of node IDs to export (default: discover the top-level frames of every page)')
+    parser.add_argument('--from-index', action='store_true', help='Select the nodes to export from the local node index (see figma-index.py)')
+    parser.add_argument('--type', default='FRAME', help='When discovering or with --from-index: node type to export (default: FRAME)')
+    parser.add_argument('--page', help='When discovering or with --from-index: only nodes on this page')
+    parser.add_argument('--name', help='When discovering or with --from-index: node name glob, e.g. "Icon/*"')
     parser.add_argument('--format', choices=['png', 'svg'], default='png', help='Export format (default: png)')
     parser.add_argument('--scale', type=int, default=2, help='Scale for PNG export (default: 2)')
-    parser.add_argument('--out', default='./exports', help='Output directory (default: ./exports)')
+    parser.add_argument('--out', default='./exports', help='Output directory; in batch mode each file gets a subdirectory named after its key (default: ./exports)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of parallel render batches and downloads (default: 8)')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Maximum node IDs per render request (default: 50)')
+    parser.add_argument('--force', action='store_true', help='Re-render every node even if the export manifest shows it unchanged')
+    parser.add_argument(
+        '--download-timeout', type=float, default=DOWNLOAD_TIMEOUT,
+        help=f'Seconds an image download may stall before it is retried (default: {DOWNLOAD_TIMEOUT})'
+    )
+    parser.add_argument(
+        '--download-retries', type=int, default=DOWNLOAD_RETRIES,
+        help=f'Retries per image download, resuming where the last attempt stopped (default: {DOWNLOAD_RETRIES})'
+    )
+    add_batch_arguments(parser)
+    add_timing_arguments(parser)
     
     args = parser.parse_args()
+    file_keys = get_file_keys(parser, args)
+    if args.node_ids and args.from_index:
+        parser.error('--node-ids and --from-index cannot be combined')
+    if args.node_ids and len(file_keys) > 1:
+        parser.error('--node-ids applies to a single file; use discovery or --from-index in batch mode')
     
-    try:
-        # Load token
-        env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
-        token = load_env_token(env_path)
-        
-        # Parse node IDs
-        node_ids = [nid.strip() for nid in args.node_ids.split(',')]
-        
-        # Build API URL
-        ids_param = ','.join(node_ids)
-        url = f"https://api.figma.com/v1/images/{args.file_key}?ids={ids_param}&format={args.format}"
-        
-        if args.format == 'png':
-            url += f"&scale={args.scale}"
-        
-        print(f"Requesting images for {len(node_ids)} node(s)...")
-        print(f"Format: {args.format}, Scale: {args.scale if args.format == 'png' else 'N/A'}")
-        print()
-        
-        # Make API request
-        data = make_figma_request(url, token)
-        
-        # Check for errors
-        if 'err' in data and data['err']:
-            raise Exception(f"API Error: {data['err']}")
-        
-        images = data.get('images', {})
-        
-        if not images:
-            print("No images returned from API")
-            sys.exit(1)
-        
-        # Create output directory
-        output_dir = Path(args.out)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        print(f"Downloading to: {output_dir.resolve()}")
-        print("-" * 80)
-        
-        # Download each image
-        success_count = 0
-        for node_id, image_url in images.items():
-            if not image_url:
-                print(f"✗ {node_id}: No image URL returned (node may not exist or is not exportable)")
-                continue
+    with instrument(args):
+        try:
+            # Load token
+            token = get_token()
             
-            # Create filename
-            safe_node_id = sanitize_filename(node_id)
-            filename = f"{safe_node_id}.{args.format}"
-            output_path = output_dir / filename
+            if len(file_keys) == 1:
+                export_frames(file_keys[0], args, token, args.out, sys.stdout)
+            elif run_batch(
+                file_keys,
+                lambda file_key, out: export_frames(
+                    file_key, args, token, Path(args.out) / sanitize_filename(file_key), out
+                ),
+                args.jobs,
+            ):
+                sys.exit(1)
             
-            try:
-                download_file(image_url, output_path)
-                file_size = output_path.stat().st_size
-                print(f"✓ {node_id} → {filename} ({file_size:,} bytes)")
-                success_count += 1
-            except Exception as e:
-                print(f"✗ {node_id}: {e}")
-        
-        print("-" * 80)
-        print(f"Downloaded {success_count}/{len(node_ids)} images successfully")
-        
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
 
 
 if __name__ == '__main__':
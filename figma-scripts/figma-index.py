@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import json
+import sys
+
+from figma_cache import add_cache_arguments
+from figma_client import get_token
+from figma_daemon import run_in_daemon
+from figma_index import INDEX_PATH, build_index, open_index, query_nodes
+from figma_timings import add_timing_arguments, instrument
+
+
+def print_rows(rows, output_format):
+    """Print query results as text lines or a JSON list."""
+    if output_format == 'json':
+        print(json.dumps([dict(row) for row in rows], ensure_ascii=False, indent=2))
+        return
+    for row in rows:
+        hidden = " (hidden)" if not row['visible'] else ""
+        print(f"├─ [{row['type']}] {row['name']} (id: {row['id']}){hidden}")
+        print(f"     Page: {row['page'] or 'N/A'}  Parent: {row['parent_id'] or 'N/A'}")
+    print(f"{len(rows)} node(s)")
+
+
+def main():
+    # Hand the command to a running figma-daemon.py, if any
+    status = run_in_daemon(__file__)
+    if status is not None:
+        sys.exit(status)
+
+    parser = argparse.ArgumentParser(
+        description='Build and query a local SQLite index of every node in a Figma file'
+    )
+    parser.add_argument('--db', default=INDEX_PATH, help=f'Index database path (default: {INDEX_PATH})')
+    add_timing_arguments(parser)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Index (or re-index) a file')
+    build_parser.add_argument('file_key', help='Figma file key')
+    build_parser.add_argument('--stream', action='store_true', help='Parse the document incrementally instead of loading it into memory')
+    add_cache_arguments(build_parser)
+
+    query_parser = subparsers.add_parser('query', help='Look up indexed nodes without network access')
+    query_parser.add_argument('file_key', help='Figma file key')
+    query_parser.add_argument('--id', help='Node ID')
+    query_parser.add_argument('--type', help='Node type, e.g. TEXT, FRAME, INSTANCE')
+    query_parser.add_argument('--name', help='Node name glob, e.g. "Button*"')
+    query_parser.add_argument('--page', help='Page name')
+    query_parser.add_argument('--font', help='Font family of text nodes')
+    query_parser.add_argument('--style', help='Style ID or published style name the node uses')
+    query_parser.add_argument('--component', help='Component ID or name; lists its instances')
+    visibility = query_parser.add_mutually_exclusive_group()
+    visibility.add_argument('--hidden', action='store_true', help='Only invisible nodes')
+    visibility.add_argument('--visible', action='store_true', help='Only visible nodes')
+    query_parser.add_argument('--limit', type=int, help='Maximum number of results')
+    query_parser.add_argument('--format', choices=['text', 'json'], default='text', help='Output format (default: text)')
+
+    args = parser.parse_args()
+
+    with instrument(args):
+        try:
+            with contextlib.closing(open_index(args.db)) as conn:
+                if args.command == 'build':
+                    token = get_token()
+                    count = build_index(
+                        conn, args.file_key, token, stream=args.stream, use_cache=not args.no_cache, refresh=args.refresh
+                    )
+                    if count is None:
+                        print(f"Index for {args.file_key} is up to date")
+                    else:
+                        print(f"Indexed {count:,} nodes from {args.file_key} into {args.db}")
+                    return
+
+                visible = True if args.visible else False if args.hidden else None
+                rows = query_nodes(
+                    conn, args.file_key, node_id=args.id, node_type=args.type, name=args.name, page=args.page,
+                    font=args.font, style=args.style, component=args.component, visible=visible, limit=args.limit
+                )
+                print_rows(rows, args.format)
+
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,237 +1,165 @@
 #!/usr/bin/env python3
 import argparse
-import json
-import os
 import sys
-import urllib.request
-import urllib.error
 from pathlib import Path
 
-
-def load_env_token(env_path):
-    """Load FIGMA_ACCESS_TOKEN from .env file."""
-    try:
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip().strip('"').strip("'")
-                        if key == 'FIGMA_ACCESS_TOKEN':
-                            return value
-        raise ValueError("FIGMA_ACCESS_TOKEN not found in .env file")
-    except FileNotFoundError:
-        raise FileNotFoundError(f".env file not found at {env_path}")
-
-
-def make_figma_request(url, token):
-    """Make authenticated request to Figma API."""
-    headers = {
-        'X-Figma-Token': token
-    }
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read().decode('utf-8', errors='replace'))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8', errors='replace')
-        raise Exception(f"HTTP {e.code}: {error_body}")
-    except urllib.error.URLError as e:
-        raise Exception(f"URL Error: {e.reason}")
-
-
-def rgba_to_hex(color):
-    """Convert RGBA color object to hex string."""
-    r = int(color.get('r', 0) * 255)
-    g = int(color.get('g', 0) * 255)
-    b = int(color.get('b', 0) * 255)
-    a = color.get('a', 1)
+from figma_batch import add_batch_arguments, get_file_keys, run_batch
+from figma_cache import add_cache_arguments, fetch_file_document, open_file_document, remember
+from figma_client import fetch_published, get_token, iter_nodes
+from figma_compact import STYLE_FIELDS
+from figma_daemon import run_in_daemon
+from figma_reports import write_styles_report
+from figma_stream import NodeStream, walk_stream
+from figma_sync import sync_pages
+from figma_timings import add_timing_arguments, instrument, phase
+from figma_tokens import DEFAULT_DELTA_E, StyleCollector, style_values
+from figma_tree import skip_hidden, walk
+
+
+STYLE_SECTIONS = (('FILL', 'COLOR STYLES'), ('TEXT', 'TEXT STYLES'), ('EFFECT', 'EFFECT STYLES'), ('GRID', 'GRID STYLES'))
+
+
+def resolve_published_styles(file_key, published, token, concurrency):
+    """Fetch just the published styles' nodes and return {node_id: values, or None if missing}."""
+    style_types = {style_meta.get('node_id'): style_meta.get('style_type') for style_meta in published}
+    node_ids = [node_id for node_id in style_types if node_id]
+    values = {}
+    for batch in iter_nodes(file_key, node_ids, token, depth=1, concurrency=concurrency):
+        for node_id, document in batch.items():
+            values[node_id] = style_values(style_types[node_id], document) if document else None
+    return values
+
+
+def print_published_styles(file_key, args, token, out):
+    """Print the published styles of one file as named tokens with their resolved values."""
+    published = fetch_published(file_key, 'styles', token)
+    values = resolve_published_styles(file_key, published, token, args.concurrency)
     
-    if a < 1:
-        return f"#{r:02x}{g:02x}{b:02x} (opacity: {a:.2f})"
-    return f"#{r:02x}{g:02x}{b:02x}"
-
-
-def extract_fills(fills):
-    """Extract color information from fills."""
-    colors = []
-    if not fills:
-        return colors
-    
-    for fill in fills:
-        if fill.get('type') == 'SOLID' and fill.get('visible', True):
-            color = fill.get('color')
-            if color:
-                colors.append(rgba_to_hex(color))
-    return colors
-
-
-def extract_text_style(style):
-    """Extract text style information."""
-    info = {}
-    if 'fontFamily' in style:
-        info['font'] = style['fontFamily']
-    if 'fontSize' in style:
-        info['size'] = f"{style['fontSize']}px"
-    if 'fontWeight' in style:
-        info['weight'] = style['fontWeight']
-    if 'lineHeightPx' in style:
-        info['line_height'] = f"{style['lineHeightPx']}px"
-    if 'letterSpacing' in style:
-        info['letter_spacing'] = style['letterSpacing']
-    if 'textAlignHorizontal' in style:
-        info['align'] = style['textAlignHorizontal']
-    return info
-
-
-def extract_effects(effects):
-    """Extract effect information."""
-    effect_list = []
-    if not effects:
-        return effect_list
-    
-    for effect in effects:
-        if effect.get('visible', True):
-            effect_type = effect.get('type', 'UNKNOWN')
-            effect_info = {'type': effect_type}
-            
-            if 'color' in effect:
-                effect_info['color'] = rgba_to_hex(effect['color'])
-            if 'radius' in effect:
-                effect_info['radius'] = effect['radius']
-            if 'offset' in effect:
-                offset = effect['offset']
-                effect_info['offset'] = f"x:{offset.get('x', 0)}, y:{offset.get('y', 0)}"
-            
-            effect_list.append(effect_info)
+    with phase('output'):
+        print("=" * 80, file=out)
+        print("PUBLISHED STYLE TOKENS", file=out)
+        print(f"Key: {file_key}", file=out)
+        print(f"Total Styles: {len(published)}", file=out)
+        print("=" * 80, file=out)
+        print(file=out)
+        
+        for style_type, title in STYLE_SECTIONS:
+            print(f"{title}:", file=out)
+            print("-" * 80, file=out)
+            section = [style_meta for style_meta in published if style_meta.get('style_type') == style_type]
+            if not section:
+                print(f"  No {title.lower()} found", file=out)
+                print(file=out)
+            for i, style_meta in enumerate(section, 1):
+                print(f"  {i}. {style_meta.get('name', 'Unnamed')}", file=out)
+                resolved = values.get(style_meta.get('node_id'))
+                if resolved is None:
+                    print("     (style node not found)", file=out)
+                elif not resolved:
+                    print("     (no visible values)", file=out)
+                for info in resolved or []:
+                    for key, value in info.items():
+                        print(f"     {key}: {value}", file=out)
+                if style_meta.get('description'):
+                    print(f"     description: {style_meta['description']}", file=out)
+                print(file=out)
+
+
+def extract_styles(file_key, args, token, out):
+    """Extract and print the styles of one file."""
+    # Extract styles from document
+    collector = StyleCollector()
+    prune = skip_hidden if args.skip_hidden else None
     
-    return effect_list
-
+    if args.incremental:
+        def extract_page(page_document):
+            page_collector = StyleCollector()
+            walk(page_document, [page_collector], prune=prune)
+            return page_collector.to_json()
+        
+        # Versioned so snapshots from before style references were recorded are re-extracted
+        analysis = 'styles-v2:skip-hidden' if args.skip_hidden else 'styles-v2'
+        data, page_results = sync_pages(
+            file_key, token, analysis, extract_page, args.concurrency, refresh=args.refresh
+        )
+        for _, _, page_tokens in page_results:
+            collector.merge_json(page_tokens)
+    elif args.stream:
+        # Nodes are processed as they are parsed, children before parents
+        with open_file_document(file_key, token, use_cache=not args.no_cache, refresh=args.refresh) as f:
+            stream = NodeStream(f)
+            walk_stream(stream, [collector], prune=prune)
+        data = stream.meta
+        collector.sort()
+    else:
+        # Get file data
+        data = fetch_file_document(
+            file_key, token, use_cache=not args.no_cache, refresh=args.refresh, fields=STYLE_FIELDS
+        )
+        document = data.get('document')
+        if document:
+            def collect():
+                document_collector = StyleCollector()
+                walk(document, [document_collector], prune=prune)
+                return document_collector
 
-def find_nodes_with_styles(node, colors, text_styles, effects_list):
-    """Recursively find nodes with styling information."""
-    # Extract fills (colors)
-    if 'fills' in node:
-        node_colors = extract_fills(node['fills'])
-        for color in node_colors:
-            if color not in colors:
-                colors.append(color)
+            # A running daemon reuses the collection while the file version is unchanged
+            collector = remember(file_key, data, ('styles', args.skip_hidden), collect)
     
-    # Extract text styles
-    if 'style' in node and node.get('type') in ['TEXT']:
-        text_info = extract_text_style(node['style'])
-        if text_info:
-            text_info['name'] = node.get('name', 'Unnamed')
-            # Check if similar style already exists
-            if text_info not in text_styles:
-                text_styles.append(text_info)
-    
-    # Extract effects
-    if 'effects' in node:
-        node_effects = extract_effects(node['effects'])
-        for effect in node_effects:
-            if effect not in effects_list:
-                effects_list.append(effect)
-    
-    # Recurse through children
-    if 'children' in node:
-        for child in node['children']:
-            find_nodes_with_styles(child, colors, text_styles, effects_list)
+    # Get styles metadata
+    published = fetch_published(file_key, 'styles', token)
+    write_styles_report(out, file_key, data, collector, published, args.cluster)
 
 
 def main():
+    # Hand the command to a running figma-daemon.py, if any
+    status = run_in_daemon(__file__)
+    if status is not None:
+        sys.exit(status)
+    
     parser = argparse.ArgumentParser(
         description='Extract colors, text styles, and effects from Figma file'
     )
-    parser.add_argument('file_key', help='Figma file key')
+    parser.add_argument(
+        '--published', action='store_true',
+        help='Only resolve the published styles, fetching just their nodes instead of the whole document'
+    )
+    parser.add_argument('--stream', action='store_true', help='Parse the document incrementally instead of loading it into memory')
+    parser.add_argument('--skip-hidden', action='store_true', help='Ignore invisible layers and everything inside them')
+    parser.add_argument(
+        '--cluster', type=float, nargs='?', const=DEFAULT_DELTA_E, metavar='DELTA_E',
+        help=f'Merge near-duplicate colors (and effects differing only by them) within this CIE76 ΔE, '
+             f'reporting each canonical color with its aliases (default: {DEFAULT_DELTA_E})'
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='Only re-extract pages that changed since the last incremental run '
+             '(a new file version still downloads every page to compare it)'
+    )
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallel page or node batch fetches for --incremental and --published (default: 4)')
+    add_cache_arguments(parser)
+    add_batch_arguments(parser)
+    add_timing_arguments(parser)
     
     args = parser.parse_args()
+    file_keys = get_file_keys(parser, args)
+    if args.published and (args.stream or args.incremental or args.cluster is not None):
+        parser.error('--published cannot be combined with --stream, --incremental or --cluster')
+    extract = print_published_styles if args.published else extract_styles
     
-    try:
-        # Load token
-        env_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
-        token = load_env_token(env_path)
-        
-        # Get file data
-        url = f"https://api.figma.com/v1/files/{args.file_key}"
-        data = make_figma_request(url, token)
-        
-        # Get styles metadata
-        styles_url = f"https://api.figma.com/v1/files/{args.file_key}/styles"
-        styles_data = make_figma_request(styles_url, token)
-        
-        # Extract styles from document
-        colors = []
-        text_styles = []
-        effects_list = []
-        
-        document = data.get('document')
-        if document:
-            find_nodes_with_styles(document, colors, text_styles, effects_list)
-        
-        # Print results
-        print("=" * 80)
-        print(f"STYLES FROM: {data.get('name', 'Unknown')}")
-        print(f"Key: {args.file_key}")
-        print("=" * 80)
-        print()
-        
-        # Print colors
-        print("COLORS:")
-        print("-" * 80)
-        if colors:
-            for i, color in enumerate(colors, 1):
-                print(f"  {i}. {color}")
-        else:
-            print("  No colors found")
-        print()
-        
-        # Print text styles
-        print("TEXT STYLES:")
-        print("-" * 80)
-        if text_styles:
-            for i, style in enumerate(text_styles, 1):
-                print(f"  {i}. {style.get('name', 'Unnamed')}")
-                for key, value in style.items():
-                    if key != 'name':
-                        print(f"     {key}: {value}")
-                print()
-        else:
-            print("  No text styles found")
-        print()
-        
-        # Print effects
-        print("EFFECTS:")
-        print("-" * 80)
-        if effects_list:
-            for i, effect in enumerate(effects_list, 1):
-                print(f"  {i}. Type: {effect.get('type')}")
-                for key, value in effect.items():
-                    if key != 'type':
-                        print(f"     {key}: {value}")
-                print()
-        else:
-            print("  No effects found")
-        print()
-        
-        # Print published styles metadata
-        print("PUBLISHED STYLES:")
-        print("-" * 80)
-        meta = styles_data.get('meta', {})
-        if meta.get('styles'):
-            for style_id, style_meta in meta['styles'].items():
-                print(f"  • {style_meta.get('name', 'Unnamed')}")
-                print(f"    Type: {style_meta.get('style_type', 'N/A')}")
-                print(f"    Description: {style_meta.get('description', 'N/A')}")
-                print()
-        else:
-            print("  No published styles found")
-        
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-        sys.exit(1)
+    with instrument(args):
+        try:
+            # Load token
+            token = get_token()
+            
+            if len(file_keys) == 1:
+                extract(file_keys[0], args, token, sys.stdout)
+            elif run_batch(file_keys, lambda file_key, out: extract(file_key, args, token, out), args.jobs):
+                sys.exit(1)
+            
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
 
 
 if __name__ == '__main__':
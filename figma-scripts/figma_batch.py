@@ -0,0 +1,114 @@
+"""Run a script over many Figma files at once.
+
+Each script takes one or more file keys (or a manifest file) and hands
+run_batch a process(file_key, out) function. Files are processed
+concurrently from an asyncio event loop; the blocking HTTP work runs on
+worker threads that share figma_client's connection pool and rate limiter,
+so the whole batch stays under one request budget. Each file's output is
+buffered and written as soon as that file finishes, and a failure is
+reported for its own file without stopping the others.
+"""
+import argparse
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from figma_client import set_rate_limit
+
+
+DEFAULT_JOBS = 4
+
+
+def positive_rate(value):
+    """Parse a --rate-limit value, which must be above zero."""
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = 0
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f"expected a positive number of requests per second, got {value!r}")
+    return rate
+
+
+def add_batch_arguments(parser):
+    """Add the file key list, --manifest, --jobs and --rate-limit options to a script's parser."""
+    parser.add_argument('file_keys', nargs='*', metavar='file_key', help='Figma file key(s)')
+    parser.add_argument('--manifest', help='File listing one file key per line (blank lines and # comments are ignored)')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help=f'Files processed at once in batch mode (default: {DEFAULT_JOBS})')
+    parser.add_argument(
+        '--rate-limit', type=positive_rate, metavar='RPS',
+        help='Maximum Figma API requests per second across all files '
+             '(default: FIGMA_RATE_LIMIT or unlimited; 429s are always honoured)'
+    )
+
+
+def read_manifest(path):
+    """Return the file keys listed in a manifest file."""
+    keys = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                keys.append(line)
+    return keys
+
+
+def get_file_keys(parser, args):
+    """Return the requested file keys in order without duplicates; exit via parser if none.
+
+    Also installs --rate-limit, if given, as the process-wide rate limiter.
+    """
+    keys = list(args.file_keys)
+    if args.manifest:
+        try:
+            keys.extend(read_manifest(args.manifest))
+        except OSError as e:
+            parser.error(f"cannot read manifest: {e}")
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        parser.error('at least one file_key or --manifest is required')
+    if args.rate_limit:
+        set_rate_limit(args.rate_limit)
+    return keys
+
+
+def _process_one(process, file_key):
+    """Run process for one file into a buffer; return (output, error)."""
+    out = io.StringIO()
+    try:
+        process(file_key, out)
+        return out.getvalue(), None
+    except Exception as e:
+        return out.getvalue(), e
+
+
+async def _run_all(file_keys, process, jobs, out, err):
+    loop = asyncio.get_running_loop()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [
+            loop.run_in_executor(executor, _process_one, process, file_key)
+            for file_key in file_keys
+        ]
+        keys_by_future = dict(zip(futures, file_keys))
+        pending = set(futures)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Keep the listed order among files that finish together
+            for future in sorted(done, key=futures.index):
+                output, error = future.result()
+                out.write(output)
+                out.flush()
+                if error is not None:
+                    failures += 1
+                    print(f"Error [{keys_by_future[future]}]: {error}", file=err, flush=True)
+    return failures
+
+
+def run_batch(file_keys, process, jobs=DEFAULT_JOBS, out=None, err=None):
+    """Run process(file_key, out) for every file, writing each file's output as it completes.
+
+    Returns the number of files that failed.
+    """
+    return asyncio.run(_run_all(file_keys, process, jobs, out or sys.stdout, err or sys.stderr))
@@ -0,0 +1,353 @@
+"""Persistent on-disk cache for full /v1/files documents.
+
+Entries are keyed by file key, Figma version and lastModified. Before using
+an entry the scripts make a cheap depth=1 probe to learn the file's current
+version, so an unchanged file is served from disk without downloading the
+whole document.
+
+A long-running process (see figma_daemon) can also keep recently parsed
+documents in memory and reuse version probes for a few seconds, with
+configure_memory_cache.
+"""
+import contextlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from figma_client import API_BASE, fetch_figma_bytes, make_figma_request, open_figma_request
+from figma_compact import decode_body
+from figma_timings import get_timings, phase
+
+
+CACHE_DIR = os.environ.get(
+    'FIGMA_CACHE_DIR',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'figma-scripts'),
+)
+MAX_CACHE_BYTES = int(os.environ.get('FIGMA_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+
+class MemoryCache:
+    """Parsed documents, analysis results and recent version probes held in memory.
+
+    Entries are keyed by file key, version, lastModified and a name such as
+    ('document', fields); the least recently used are evicted first, and
+    entries for older versions of a file as soon as a newer one is stored.
+    """
+
+    def __init__(self, max_entries=0, probe_ttl=0):
+        self.max_entries = max_entries
+        self.probe_ttl = probe_ttl
+        self.entries = OrderedDict()
+        self.probes = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_key, version, last_modified, name):
+        key = (file_key, version, last_modified, name)
+        with self._lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, file_key, version, last_modified, name, value):
+        if not self.max_entries or not version:
+            return
+        with self._lock:
+            stale = [key for key in self.entries if key[0] == file_key and key[1:3] != (version, last_modified)]
+            for key in stale:
+                del self.entries[key]
+            self.entries[(file_key, version, last_modified, name)] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def remember(self, file_key, version, last_modified, name, compute):
+        """Return compute(), reusing its result for the same file version while it stays cached."""
+        value = self.get(file_key, version, last_modified, name)
+        if value is None:
+            value = compute()
+            self.put(file_key, version, last_modified, name, value)
+        return value
+
+    def get_probe(self, file_key):
+        with self._lock:
+            entry = self.probes.get(file_key)
+        if entry and time.monotonic() - entry[0] < self.probe_ttl:
+            return entry[1]
+        return None
+
+    def put_probe(self, file_key, probe):
+        if self.probe_ttl:
+            with self._lock:
+                self.probes[file_key] = (time.monotonic(), probe)
+
+
+_memory = MemoryCache()
+
+
+def configure_memory_cache(max_entries, probe_ttl=0):
+    """Keep up to max_entries documents and results in memory and reuse probes for probe_ttl seconds."""
+    global _memory
+    _memory = MemoryCache(max_entries, probe_ttl)
+
+
+def get_memory_cache():
+    return _memory
+
+
+def remember(file_key, data, name, compute):
+    """Return compute() for an analysis of a fetched document, reused while it is held in memory."""
+    return _memory.remember(file_key, data.get('version'), data.get('lastModified'), name, compute)
+
+
+def safe_filename(value):
+    """Make a string safe to use in a cache filename."""
+    return re.sub(r'[^A-Za-z0-9._-]', '_', str(value))
+
+
+class DocumentCache:
+    """Directory of cached file documents with size-based LRU eviction."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path_for(self, file_key, version, last_modified):
+        return os.path.join(
+            self.cache_dir, f"{safe_filename(file_key)}--{safe_filename(version)}--{safe_filename(last_modified)}.json"
+        )
+
+    def open(self, file_key, version, last_modified):
+        """Return the cached response body as a binary file, or None on a miss."""
+        path = self.path_for(file_key, version, last_modified)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        # Mark as recently used for eviction
+        os.utime(path)
+        return f
+
+    def load(self, file_key, version, last_modified, fields=None):
+        """Return the cached document for this version, or None on a miss."""
+        f = self.open(file_key, version, last_modified)
+        if f is None:
+            return None
+        with f:
+            body = f.read()
+        with phase('decode'):
+            try:
+                return decode_body(body, fields)
+            except ValueError:
+                return None
+
+    def writer(self, file_key, version, last_modified):
+        """Return a CacheWriter that becomes this version's entry when committed."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        return CacheWriter(self, os.fdopen(fd, 'wb'), tmp_path, file_key,
+                           self.path_for(file_key, version, last_modified))
+
+    def store(self, file_key, version, last_modified, body):
+        """Write a raw response body for this version, replacing older versions of the file."""
+        writer = self.writer(file_key, version, last_modified)
+        try:
+            writer.write(body)
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def _commit(self, tmp_path, path, file_key):
+        os.replace(tmp_path, path)
+        prefix = f"{safe_filename(file_key)}--"
+        for name in os.listdir(self.cache_dir):
+            other = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and name.endswith('.json') and other != path:
+                # Batch mode commits from several threads, which may race to remove the same entry
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(other)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            total -= size
+
+
+class CacheWriter:
+    """Temporary file that is atomically moved into the cache on commit."""
+
+    def __init__(self, cache, f, tmp_path, file_key, path):
+        self._cache = cache
+        self._f = f
+        self._tmp_path = tmp_path
+        self._file_key = file_key
+        self._path = path
+
+    def write(self, data):
+        self._f.write(data)
+
+    def commit(self):
+        self._f.close()
+        self._cache._commit(self._tmp_path, self._path, self._file_key)
+
+    def abort(self):
+        self._f.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class TeeReader:
+    """Binary stream that copies everything read into a CacheWriter.
+
+    The entry is committed only once the underlying stream is read to EOF;
+    closing early discards it.
+    """
+
+    def __init__(self, fp, writer):
+        self._fp = fp
+        self._writer = writer
+
+    def read(self, amt=None):
+        data = self._fp.read(amt)
+        if self._writer is not None:
+            if data:
+                self._writer.write(data)
+            else:
+                self._writer.commit()
+                self._writer = None
+        return data
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_cache_arguments(parser):
+    """Add the --no-cache/--refresh switches shared by scripts that fetch full documents."""
+    parser.add_argument('--no-cache', action='store_true', help='Always download the full document and skip the local cache')
+    parser.add_argument('--refresh', action='store_true', help='Re-download the full document and update the local cache')
+
+
+def probe_version(file_key, token):
+    """Return (version, lastModified) from a cheap depth=1 request."""
+    probe = _memory.get_probe(file_key)
+    if probe is None:
+        data = make_figma_request(f"{API_BASE}/files/{file_key}?depth=1", token)
+        probe = data.get('version'), data.get('lastModified')
+        _memory.put_probe(file_key, probe)
+    return probe
+
+
+def fetch_file_document(file_key, token, use_cache=True, refresh=False, fields=None):
+    """Return the full /v1/files response, served from the local cache when the version is unchanged.
+
+    With fields, nodes are decoded as compact records keeping only those fields.
+    """
+    url = f"{API_BASE}/files/{file_key}"
+    if not use_cache:
+        return make_figma_request(url, token, fields=fields)
+
+    version, last_modified = probe_version(file_key, token)
+    if not version:
+        return make_figma_request(url, token, fields=fields)
+
+    cache = DocumentCache()
+    if not refresh:
+        # A fully decoded document serves any compact request too
+        data = (
+            _memory.get(file_key, version, last_modified, ('document', fields))
+            or _memory.get(file_key, version, last_modified, ('document', None))
+        )
+        if data is not None:
+            get_timings().count('memory_hits')
+            return data
+        data = cache.load(file_key, version, last_modified, fields)
+        if data is not None:
+            get_timings().count('cache_hits')
+            _memory.put(file_key, version, last_modified, ('document', fields), data)
+            return data
+    get_timings().count('cache_misses')
+
+    body = fetch_figma_bytes(url, token)
+    with phase('decode'):
+        data = decode_body(body, fields)
+    # Only cache what matches the probed version, in case the file changed in between
+    if data.get('version') == version:
+        cache.store(file_key, version, last_modified, body)
+        _memory.put(file_key, version, last_modified, ('document', fields), data)
+    return data
+
+
+def fetch_file_listing(file_key, token, depth, fields=None):
+    """Return a depth-limited /v1/files response.
+
+    Kept in memory by a long-running process; otherwise fetched directly,
+    without a version probe.
+    """
+    url = f"{API_BASE}/files/{file_key}?depth={depth}"
+    if not _memory.max_entries:
+        return make_figma_request(url, token, fields=fields)
+    version, last_modified = probe_version(file_key, token)
+    return _memory.remember(
+        file_key, version, last_modified, ('listing', depth, fields),
+        lambda: make_figma_request(url, token, fields=fields),
+    )
+
+
+def open_file_document(file_key, token, use_cache=True, refresh=False):
+    """Open the full /v1/files response as a binary stream for incremental parsing.
+
+    Served from the local cache when the version is unchanged; otherwise the
+    network response is copied into the cache as it is read.
+    """
+    url = f"{API_BASE}/files/{file_key}"
+    if not use_cache:
+        return open_figma_request(url, token)
+
+    version, last_modified = probe_version(file_key, token)
+    if not version:
+        return open_figma_request(url, token)
+
+    cache = DocumentCache()
+    if not refresh:
+        f = cache.open(file_key, version, last_modified)
+        if f is not None:
+            get_timings().count('cache_hits')
+            return f
+    get_timings().count('cache_misses')
+
+    # The body is not inspected before caching; a save landing between the
+    # probe and this request only costs one extra download next run
+    return TeeReader(open_figma_request(url, token), cache.writer(file_key, version, last_modified))
@@ -0,0 +1,447 @@
+"""Shared Figma API client for the figma-scripts.
+
+All scripts go through one ConnectionPool, which keeps persistent HTTP/1.1
+connections per host. Runs that make several requests (API calls followed by
+image downloads) only pay the TCP/TLS handshake once per host.
+"""
+import http.client
+import os
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from figma_compact import decode_body
+from figma_timings import get_timings, phase
+
+
+API_BASE = os.environ.get('FIGMA_API_BASE', 'https://api.figma.com/v1').rstrip('/')
+ENV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+RETRY_CODES = (429, 500, 502, 503, 504)
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 1.0
+NODES_BATCH_SIZE = 20
+ACCEPT_ENCODING = 'gzip, deflate'
+# zlib window bits per Content-Encoding (gzip header / zlib header)
+DECOMPRESS_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'x-gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+# Errors that mean a pooled connection was closed by the server while idle
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class FigmaAPIError(Exception):
+    """HTTP error response from the Figma API (or an image host)."""
+
+    def __init__(self, status, body, headers=None):
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    @property
+    def retry_after(self):
+        """Seconds from the Retry-After header, or None."""
+        try:
+            return float(self.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+
+class FigmaConnectionError(Exception):
+    """Network-level failure talking to the Figma API (or an image host)."""
+
+
+def load_env_token(env_path):
+    """Load FIGMA_ACCESS_TOKEN from .env file."""
+    try:
+        with open(env_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    if '=' in line:
+                        key, value = line.split('=', 1)
+                        key = key.strip()
+                        value = value.strip().strip('"').strip("'")
+                        if key == 'FIGMA_ACCESS_TOKEN':
+                            return value
+        raise ValueError("FIGMA_ACCESS_TOKEN not found in .env file")
+    except FileNotFoundError:
+        raise FileNotFoundError(f".env file not found at {env_path}")
+
+
+def get_token(env_path=ENV_PATH):
+    """Return FIGMA_ACCESS_TOKEN from the environment, falling back to the .env file."""
+    with phase('token'):
+        token = os.environ.get('FIGMA_ACCESS_TOKEN')
+        if token:
+            return token
+        return load_env_token(env_path)
+
+
+class PooledResponse:
+    """HTTP response that hands its connection back to the pool when closed.
+
+    A gzip or deflate Content-Encoding is decoded incrementally, so read()
+    always returns the plain body while only compressed bytes cross the
+    wire. Closing also records the exchange (status, time to headers, bytes
+    on the wire and read time) in the process-wide timings.
+    """
+
+    def __init__(self, pool, key, conn, response, method='GET', url=None, started=None):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+        self._method = method
+        self._url = url
+        self._headers_at = time.perf_counter()
+        self._started = started if started is not None else self._headers_at
+        self._last_read_at = self._headers_at
+        self.bytes_read = 0
+        self.encoding = (response.getheader('Content-Encoding') or '').strip().lower() or None
+        self._decompressor = None
+        if self.encoding in DECOMPRESS_WBITS:
+            self._decompressor = zlib.decompressobj(DECOMPRESS_WBITS[self.encoding])
+        self._pending = b''
+        self._eof = False
+
+    def _read_raw(self, amt):
+        data = self._response.read(amt)
+        self.bytes_read += len(data)
+        self._last_read_at = time.perf_counter()
+        return data
+
+    def _decompress(self, data, max_length=0):
+        try:
+            return self._decompressor.decompress(data, max_length)
+        except zlib.error:
+            # Some servers send raw deflate without the zlib header
+            if self.encoding != 'deflate' or self.bytes_read > len(data):
+                raise
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompressor.decompress(data, max_length)
+
+    def read(self, amt=None):
+        if self._decompressor is None:
+            return self._read_raw(amt)
+        if amt is None:
+            data = self._decompressor.unconsumed_tail + self._read_raw(None)
+            data = self._pending + self._decompress(data) + self._decompressor.flush()
+            self._pending = b''
+            self._eof = True
+            return data
+        # Inflate at most amt bytes at a time so a highly compressed chunk
+        # never expands into one huge buffer
+        while len(self._pending) < amt and not self._eof:
+            chunk = self._decompressor.unconsumed_tail or self._read_raw(amt)
+            if chunk:
+                self._pending += self._decompress(chunk, amt - len(self._pending))
+            else:
+                self._pending += self._decompressor.flush()
+                self._eof = True
+        data, self._pending = self._pending[:amt], self._pending[amt:]
+        return data
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def close(self):
+        if self._conn is None:
+            return
+        # Signed download URLs carry credentials in the query string
+        url = self._url if self._url.startswith(API_BASE) else self._url.split('?', 1)[0]
+        get_timings().record_request(
+            self._method, url, self.status, self._headers_at - self._started,
+            self.bytes_read, self._last_read_at - self._headers_at, self.encoding,
+        )
+        # Only a fully consumed body leaves the connection in a reusable state
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool._release(self._key, self._conn)
+        else:
+            self._response.close()
+            self._conn.close()
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections, keyed by host."""
+
+    def __init__(self, max_idle_per_host=8, timeout=60):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        """Return (connection, reused) for the given (scheme, host, port)."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        return conn, False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def open(self, url, headers=None, method='GET', max_redirects=5, timeout=None):
+        """Send a request and return a PooledResponse; raise FigmaAPIError on HTTP errors.
+
+        timeout (default: the pool's) bounds connecting and each socket
+        read, so a stalled server fails instead of hanging.
+        """
+        headers = dict(headers or {})
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        for attempt in range(2):
+            started = time.perf_counter()
+            conn, reused = self._acquire(key)
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+                break
+            except STALE_CONNECTION_ERRORS as e:
+                conn.close()
+                # A reused connection may have been dropped while idle; retry on a fresh one
+                if reused and attempt == 0:
+                    continue
+                raise FigmaConnectionError(f"URL Error: {e}")
+            except OSError as e:
+                conn.close()
+                raise FigmaConnectionError(f"URL Error: {e}")
+
+        pooled = PooledResponse(self, key, conn, response, method, url, started)
+
+        if response.status in REDIRECT_CODES and max_redirects > 0:
+            location = response.getheader('Location')
+            pooled.read()
+            pooled.close()
+            target = urllib.parse.urljoin(url, location)
+            # Never forward credentials to another host
+            if urllib.parse.urlsplit(target).hostname != parts.hostname:
+                headers.pop('X-Figma-Token', None)
+            return self.open(target, headers, method, max_redirects - 1, timeout)
+
+        if response.status >= 400:
+            body = pooled.read().decode('utf-8', errors='replace')
+            pooled.close()
+            raise FigmaAPIError(response.status, body, response.headers)
+
+        return pooled
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class RateLimiter:
+    """Token bucket shared by every thread making API requests.
+
+    rate is in requests per second; None means no steady-state limit. A 429
+    response pauses the whole bucket for its Retry-After, so concurrent
+    workers back off together instead of each hammering the API.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        if rate is not None and rate <= 0:
+            raise ValueError(f"rate limit must be a positive number of requests per second, got {rate}")
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate or 1))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.rate is None:
+                        return
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back all requests for the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_default_pool = None
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool shared by all requests."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
+
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter applied to Figma API requests."""
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            rate = os.environ.get('FIGMA_RATE_LIMIT')
+            try:
+                _default_limiter = RateLimiter(float(rate) if rate else None)
+            except ValueError:
+                raise ValueError(f"FIGMA_RATE_LIMIT must be a positive number of requests per second, got {rate!r}")
+        return _default_limiter
+
+
+def set_rate_limiter(limiter):
+    """Install limiter as the process-wide rate limiter and return the previous one (may be None)."""
+    global _default_limiter
+    with _default_lock:
+        previous, _default_limiter = _default_limiter, limiter
+        return previous
+
+
+def set_rate_limit(rate, burst=None):
+    """Replace the process-wide rate limiter (rate in requests per second)."""
+    set_rate_limiter(RateLimiter(rate, burst))
+
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, base * (2 ** attempt))
+
+
+def open_figma_request(url, token, retries=DEFAULT_RETRIES):
+    """Open an authenticated Figma API request and return the unread response.
+
+    Rate limited through the shared limiter. 429 and 5xx responses and
+    connection errors are retried with exponential backoff, honouring
+    Retry-After when the API sends one.
+    """
+    limiter = get_rate_limiter()
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return get_pool().open(url, {'X-Figma-Token': token, 'Accept-Encoding': ACCEPT_ENCODING})
+        except FigmaAPIError as e:
+            if e.status not in RETRY_CODES or attempt == retries:
+                raise
+            get_timings().count('throttled' if e.status == 429 else 'retries')
+            delay = e.retry_after if e.retry_after is not None else backoff_delay(attempt)
+            if e.status == 429:
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+        except FigmaConnectionError:
+            if attempt == retries:
+                raise
+            get_timings().count('retries')
+            time.sleep(backoff_delay(attempt))
+
+
+def fetch_figma_bytes(url, token, retries=DEFAULT_RETRIES):
+    """Make authenticated request to Figma API and return the raw response body."""
+    with phase('fetch'), open_figma_request(url, token, retries) as response:
+        return response.read()
+
+
+def make_figma_request(url, token, retries=DEFAULT_RETRIES, fields=None):
+    """Make authenticated request to Figma API.
+
+    With fields, document nodes are decoded as compact records keeping only
+    those fields (see figma_compact).
+    """
+    body = fetch_figma_bytes(url, token, retries)
+    with phase('decode'):
+        return decode_body(body, fields)
+
+
+def open_url(url, headers=None, timeout=None):
+    """Open an unauthenticated URL (e.g. a rendered image) on the shared pool."""
+    return get_pool().open(url, headers, timeout=timeout)
+
+
+def fetch_nodes(file_key, node_ids, token, depth=None, fields=None):
+    """Fetch node subtrees via /v1/files/{key}/nodes; return {node_id: document or None}.
+
+    With fields, nodes are decoded as compact records (see make_figma_request).
+    """
+    url = f"{API_BASE}/files/{file_key}/nodes?ids={','.join(node_ids)}"
+    if depth is not None:
+        url += f"&depth={depth}"
+    data = make_figma_request(url, token, fields=fields)
+    return {
+        node_id: (entry or {}).get('document')
+        for node_id, entry in (data.get('nodes') or {}).items()
+    }
+
+
+def iter_nodes(file_key, node_ids, token, depth=None, batch_size=NODES_BATCH_SIZE, concurrency=4, fields=None):
+    """Fetch nodes in parallel batches, yielding {node_id: document} as each batch arrives.
+
+    Closing the generator early cancels batches that have not started yet.
+    """
+    node_ids = list(node_ids)
+    batches = [node_ids[i:i + batch_size] for i in range(0, len(node_ids), batch_size)]
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = [executor.submit(fetch_nodes, file_key, batch, token, depth, fields) for batch in batches]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_published(file_key, kind, token):
+    """Return a file's published 'components' or 'styles' metadata as a list."""
+    data = make_figma_request(f"{API_BASE}/files/{file_key}/{kind}", token)
+    published = data.get('meta', {}).get(kind) or []
+    # API returns a list; older responses keyed entries by ID
+    if not isinstance(published, list):
+        published = list(published.values())
+    return published
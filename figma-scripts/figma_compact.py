@@ -0,0 +1,130 @@
+"""Compact in-memory representation of Figma document nodes.
+
+A decoded /v1/files response holds every node as a dict with all of its
+properties (geometry, constraints, export settings, prototype data, ...),
+most of which no script reads. loads_compact() projects each node into a
+__slots__ record as the JSON is decoded, keeping only the id, name, type,
+visibility and children plus whatever fields the active extractors ask
+for. Everything else is dropped before the next node is parsed, and
+repeated type and name strings share one object.
+
+Decoding also pauses the cyclic garbage collector: a large document
+allocates millions of containers, none of which can form a cycle, and
+repeated collections over them otherwise cost more than the parse itself.
+
+Nodes keep the read-only dict interface the visitors use (get, [],
+in, items), so figma_tree.walk and the collectors work on either form.
+"""
+import contextlib
+import gc
+import json
+
+
+# Kept on every node
+BASE_FIELDS = ('id', 'name', 'type', 'visible', 'children')
+
+# Extra node fields each extractor reads
+TREE_FIELDS = ()
+STYLE_FIELDS = ('fills', 'style', 'effects', 'styles')
+INDEX_FIELDS = ('style', 'styles', 'componentId')
+
+_node_classes = {}
+
+
+class CompactNode:
+    """Slotted node record; unset slots behave like missing dict keys."""
+
+    __slots__ = BASE_FIELDS
+    _fields = BASE_FIELDS
+    _field_set = frozenset(BASE_FIELDS)
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key, default)
+        return default
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._field_set and hasattr(self, key)
+
+    def keys(self):
+        return [key for key in self._fields if hasattr(self, key)]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.get('type')} {self.get('id')}>"
+
+
+def node_class(fields=()):
+    """Return the CompactNode subclass that also keeps the given fields."""
+    extra = tuple(sorted(set(fields) - set(BASE_FIELDS)))
+    if not extra:
+        return CompactNode
+    cls = _node_classes.get(extra)
+    if cls is None:
+        cls = type('CompactNode', (CompactNode,), {
+            '__slots__': extra,
+            '_fields': BASE_FIELDS + extra,
+            '_field_set': frozenset(BASE_FIELDS + extra),
+        })
+        _node_classes[extra] = cls
+    return cls
+
+
+def compact_hook(fields=()):
+    """Return a json object_hook that turns node objects into compact records."""
+    cls = node_class(fields)
+    names = cls._fields
+    strings = {}
+
+    def hook(obj):
+        # Paints, effects and variable aliases may carry a type or id, but
+        # only nodes have all three
+        if 'id' not in obj or 'type' not in obj or 'name' not in obj:
+            return obj
+        node = cls()
+        for key in names:
+            if key in obj:
+                setattr(node, key, obj[key])
+        node.type = strings.setdefault(node.type, node.type)
+        node.name = strings.setdefault(node.name, node.name)
+        return node
+
+    return hook
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Disable automatic garbage collection for the enclosed block."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def loads_compact(body, fields=()):
+    """Decode a response body, keeping only the given node fields."""
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    with gc_paused():
+        return json.loads(body, object_hook=compact_hook(fields))
+
+
+def decode_body(body, fields=None):
+    """Decode a response body in full, or compactly when fields is given."""
+    if fields is not None:
+        return loads_compact(body, fields)
+    with gc_paused():
+        return json.loads(body.decode('utf-8', errors='replace'))
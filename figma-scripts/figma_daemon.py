@@ -0,0 +1,279 @@
+"""Resident daemon that runs the figma-scripts with warm state.
+
+figma-daemon.py start serves the scripts over a Unix domain socket. Each
+script's main() first calls run_in_daemon(): when a daemon is listening,
+the command line is forwarded to it and the script's output streamed back,
+so the client only pays for interpreter startup. The daemon runs the same
+main() in-process, keeping the HTTP connection pool, parsed documents,
+analysis results (see figma_cache.configure_memory_cache) and recent
+version probes warm between calls.
+
+Protocol: the client sends one JSON line, either {"script", "argv", "cwd"}
+or {"command": "status" | "stop"}. The daemon answers with JSON lines
+{"stdout": text} and {"stderr": text}, then a final {"exit": code} (or
+the status object).
+
+Commands run one at a time, because they share the process's working
+directory, stdout and stderr. They use the daemon's environment (token,
+API base), not the client's.
+"""
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from figma_cache import CACHE_DIR, get_memory_cache
+from figma_client import get_rate_limiter, set_rate_limiter
+from figma_timings import reset_timings
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.environ.get('FIGMA_DAEMON_SOCKET', os.path.join(CACHE_DIR, 'daemon.sock'))
+SCRIPTS = (
+    'figma-file.py', 'figma-styles.py', 'figma-components.py', 'figma-frames.py', 'figma-index.py', 'figma-analyze.py',
+)
+# Output is sent in messages of about this many characters
+MESSAGE_SIZE = 64 * 1024
+
+# Set inside the daemon so scripts run there do not forward again
+_serving = False
+
+
+class SocketStream(io.TextIOBase):
+    """Text stream that forwards what is written to the client as JSON lines."""
+
+    def __init__(self, wfile, name, lock):
+        self._wfile = wfile
+        self._name = name
+        self._lock = lock
+        self._buffer = []
+        self._size = 0
+        self._broken = False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= MESSAGE_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        text = ''.join(self._buffer)
+        self._buffer = []
+        self._size = 0
+        if not text or self._broken:
+            return
+        try:
+            send_message(self._wfile, {self._name: text}, self._lock)
+        except OSError:
+            # The client went away; let the command finish without output
+            self._broken = True
+
+    def fileno(self):
+        raise io.UnsupportedOperation('fileno')
+
+
+def send_message(wfile, message, lock):
+    """Write one JSON line to the client."""
+    with lock:
+        wfile.write((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+        wfile.flush()
+
+
+_scripts = {}
+
+
+def load_script(name):
+    """Import a hyphenated script file as a module, once."""
+    module = _scripts.get(name)
+    if module is None:
+        module_name = name[:-len('.py')].replace('-', '_') + '_script'
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, name))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _scripts[name] = module
+    return module
+
+
+def exit_code(e):
+    """Return the process exit status a SystemExit stands for, printing its message if any."""
+    if e.code is None or isinstance(e.code, int):
+        return e.code or 0
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        lock = threading.Lock()
+        try:
+            request = json.loads(line)
+        except ValueError:
+            send_message(self.wfile, {'stderr': 'Error: malformed request\n'}, lock)
+            send_message(self.wfile, {'exit': 2}, lock)
+            return
+
+        command = request.get('command')
+        if command == 'status':
+            send_message(self.wfile, self.server.status(), lock)
+        elif command == 'stop':
+            send_message(self.wfile, {'stopping': True}, lock)
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            code = self.server.run_script(request.get('script'), request.get('argv') or [], request.get('cwd'), self.wfile)
+            send_message(self.wfile, {'exit': code}, lock)
+
+
+class FigmaDaemon(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server running script commands one at a time in this process."""
+
+    daemon_threads = True
+
+    def __init__(self, path=SOCKET_PATH):
+        self.path = path
+        self.started = time.time()
+        self.requests = 0
+        self._run_lock = threading.Lock()
+        super().__init__(path, DaemonHandler)
+        os.chmod(path, 0o600)
+
+    def status(self):
+        memory = get_memory_cache()
+        return {
+            'pid': os.getpid(),
+            'socket': self.path,
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'requests': self.requests,
+            'cached_entries': len(memory.entries),
+            'max_entries': memory.max_entries,
+            'probe_ttl': memory.probe_ttl,
+        }
+
+    def run_script(self, script, argv, cwd, wfile):
+        """Run one script's main() with its output sent to wfile; return its exit status."""
+        write_lock = threading.Lock()
+        stdout = SocketStream(wfile, 'stdout', write_lock)
+        stderr = SocketStream(wfile, 'stderr', write_lock)
+        if script not in SCRIPTS:
+            stderr.write(f"Error: unknown script {script!r}\n")
+            stderr.flush()
+            return 2
+
+        with self._run_lock:
+            self.requests += 1
+            saved_argv, saved_cwd = sys.argv, os.getcwd()
+            # A command's --rate-limit must not outlive it
+            saved_limiter = get_rate_limiter()
+            code = 0
+            try:
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    try:
+                        os.chdir(cwd or saved_cwd)
+                        sys.argv = [os.path.join(SCRIPT_DIR, script)] + list(argv)
+                        reset_timings()
+                        load_script(script).main()
+                    except SystemExit as e:
+                        code = exit_code(e)
+                    except Exception as e:
+                        print(f"Error: {e}", file=sys.stderr)
+                        code = 1
+            finally:
+                sys.argv = saved_argv
+                os.chdir(saved_cwd)
+                set_rate_limiter(saved_limiter)
+                stdout.flush()
+                stderr.flush()
+        return code
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+
+def serve(path=SOCKET_PATH):
+    """Create a daemon listening on path, replacing a stale socket file left by a dead daemon."""
+    global _serving
+    # A bad FIGMA_RATE_LIMIT fails the start instead of every command
+    get_rate_limiter()
+    if os.path.exists(path):
+        if request_daemon({'command': 'status'}, path) is not None:
+            raise Exception(f"A daemon is already listening on {path}")
+        os.unlink(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    _serving = True
+    return FigmaDaemon(path)
+
+
+def connect(path=SOCKET_PATH):
+    """Return a socket connected to the daemon, or None if none is listening."""
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request_daemon(request, path=SOCKET_PATH):
+    """Send a control command and return the daemon's reply, or None if none is listening."""
+    sock = connect(path)
+    if sock is None:
+        return None
+    with sock, sock.makefile('rwb') as f:
+        f.write((json.dumps(request) + '\n').encode('utf-8'))
+        f.flush()
+        line = f.readline()
+    return json.loads(line) if line else None
+
+
+def run_in_daemon(script_path, argv=None, path=SOCKET_PATH):
+    """Run a script through the daemon if one is listening.
+
+    Returns the exit status, or None when the script should run locally
+    (no daemon, FIGMA_NO_DAEMON set, or already inside the daemon).
+    """
+    if _serving or os.environ.get('FIGMA_NO_DAEMON'):
+        return None
+    sock = connect(path)
+    if sock is None:
+        return None
+    request = {
+        'script': os.path.basename(script_path),
+        'argv': sys.argv[1:] if argv is None else argv,
+        'cwd': os.getcwd(),
+    }
+    with sock, sock.makefile('rwb') as f:
+        f.write((json.dumps(request) + '\n').encode('utf-8'))
+        f.flush()
+        try:
+            for line in f:
+                message = json.loads(line)
+                if 'stdout' in message:
+                    sys.stdout.write(message['stdout'])
+                elif 'stderr' in message:
+                    sys.stderr.write(message['stderr'])
+                elif 'exit' in message:
+                    sys.stdout.flush()
+                    return message['exit']
+        except BrokenPipeError:
+            # Reader (e.g. head) went away; closing the socket tells the daemon
+            sys.stdout = open(os.devnull, 'w')
+            return 0
+    print("Error: connection to figma daemon lost", file=sys.stderr)
+    return 1
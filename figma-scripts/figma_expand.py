@@ -0,0 +1,178 @@
+"""Progressive expansion of a Figma file tree.
+
+Instead of one /v1/files request at a fixed depth, TreeExpander starts from
+the depth=1 page listing and opens only the subtrees asked for, a few
+levels at a time, with batched parallel /v1/files/{key}/nodes requests:
+the selected pages, then below them the nodes whose name matches a glob
+and everything inside a match. Each fetched subtree is grafted into the
+listing in place of its stub, so the result has the shape of a normal
+/v1/files response. Expansion stops at the target depth or once a node
+budget is spent, so the bytes downloaded follow what is being looked at
+rather than the size of the file. A subtree's size is only known once it
+arrives, so the budget is soft: each round requests as many subtrees as the
+previous round's average says will fit, and the first round (the selected
+pages) or an unusually large subtree can still overshoot it.
+"""
+import fnmatch
+
+from figma_client import API_BASE, iter_nodes, make_figma_request
+
+
+# Node types whose children a depth-limited response may have left out
+CONTAINER_TYPES = (
+    'CANVAS', 'FRAME', 'GROUP', 'SECTION', 'COMPONENT', 'COMPONENT_SET', 'INSTANCE', 'BOOLEAN_OPERATION',
+)
+DEFAULT_STEP = 2
+DEFAULT_MAX_NODES = 10000
+
+
+def count_nodes(root):
+    """Return the number of nodes in a subtree."""
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.get('children') or ())
+    return count
+
+
+class TreeExpander:
+    """Grow a depth=1 listing of a file by fetching selected subtrees level by level.
+
+    page selects pages by name (default: all) and name is a glob for the
+    nodes below them to open; max_depth (None for no limit) counts from the
+    document, max_nodes (None or 0 for no budget) softly caps the nodes fetched,
+    and step is how many levels each request asks for. prune(node) true
+    keeps a node closed. After run(), node_count, rounds, expanded and
+    unexpanded (subtrees left closed by the budget) describe what was done.
+    """
+
+    def __init__(self, file_key, token, max_depth=None, page=None, name=None, max_nodes=DEFAULT_MAX_NODES,
+                 step=DEFAULT_STEP, concurrency=4, prune=None, fields=None):
+        self.file_key = file_key
+        self.token = token
+        self.max_depth = max_depth
+        self.page = page
+        self.name = name
+        self.max_nodes = max_nodes or None
+        self.step = max(1, step)
+        self.concurrency = concurrency
+        self.prune = prune
+        self.fields = fields
+        self.node_count = 0
+        self.rounds = 0
+        # Nodes added and subtrees expanded by the latest round, to size the next
+        self.round_fetched = 0
+        self.round_expanded = 0
+        self.expanded = 0
+        self.unexpanded = 0
+
+    @property
+    def budget_reached(self):
+        return self.max_nodes is not None and self.node_count >= self.max_nodes
+
+    def round_limit(self):
+        """Return how many subtrees the next round may request, or None for no limit."""
+        if self.max_nodes is None or not self.round_expanded:
+            return None
+        average = max(1.0, self.round_fetched / self.round_expanded)
+        return max(1, int((self.max_nodes - self.node_count) / average))
+
+    def matches(self, node):
+        return self.name is None or fnmatch.fnmatchcase(node.get('name', ''), self.name)
+
+    def run(self):
+        """Return the file's /v1/files?depth=1 response with the selected subtrees expanded in place."""
+        data = make_figma_request(f"{API_BASE}/files/{self.file_key}?depth=1", self.token, fields=self.fields)
+        document = data.get('document')
+        if not document:
+            return data
+        self.node_count = count_nodes(document)
+        pages = document.get('children') or []
+        frontier = []
+        for i, page_node in enumerate(pages):
+            if self.page is None or page_node.get('name') == self.page:
+                self.consider(frontier, pages, i, 1, self.matches(page_node))
+        while frontier and not self.budget_reached:
+            frontier = self.expand(frontier)
+        self.unexpanded = len(frontier)
+        return data
+
+    def consider(self, frontier, siblings, index, depth, matched):
+        """Queue siblings[index] for expansion if it may have children and is wanted."""
+        node = siblings[index]
+        if self.max_depth is not None and depth >= self.max_depth:
+            return
+        if 'children' in node or node.get('type') not in CONTAINER_TYPES:
+            return
+        # Selected pages are always opened; below them only matches and their contents
+        if not (matched or depth == 1) or (self.prune is not None and self.prune(node)):
+            return
+        frontier.append((siblings, index, depth, matched))
+
+    def collect(self, frontier, root, depth, matched):
+        """Queue the nodes on the edge of a fetched subtree that should be expanded next."""
+        stack = [(root, depth, matched)]
+        while stack:
+            node, node_depth, node_matched = stack.pop()
+            children = node.get('children') or []
+            for i, child in enumerate(children):
+                if self.prune is not None and self.prune(child):
+                    continue
+                child_matched = node_matched or self.matches(child)
+                if 'children' in child:
+                    stack.append((child, node_depth + 1, child_matched))
+                else:
+                    self.consider(frontier, children, i, node_depth + 1, child_matched)
+
+    def expand(self, frontier):
+        """Fetch one level of frontier subtrees, grafting them in; return the next frontier.
+
+        Requests at most round_limit() subtrees and stops early once the
+        budget is spent: subtrees not requested and batches not yet sent
+        stay on the returned frontier.
+        """
+        self.rounds += 1
+        limit = self.round_limit()
+        self.round_fetched = self.round_expanded = 0
+        if limit is not None and limit < len(frontier):
+            frontier, next_frontier = frontier[:limit], frontier[limit:]
+        else:
+            next_frontier = []
+        groups = {}
+        for entry in frontier:
+            siblings, index, depth, _ = entry
+            request_depth = self.step if self.max_depth is None else min(self.step, self.max_depth - depth)
+            groups.setdefault(request_depth, {})[siblings[index].get('id')] = entry
+
+        for request_depth, entries in groups.items():
+            batches = iter_nodes(
+                self.file_key, list(entries), self.token, depth=request_depth,
+                concurrency=self.concurrency, fields=self.fields,
+            )
+            try:
+                for batch in batches:
+                    for node_id, document in batch.items():
+                        entry = entries.pop(node_id, None)
+                        if entry is None or not document:
+                            continue
+                        siblings, index, depth, matched = entry
+                        added = count_nodes(document) - 1
+                        self.node_count += added
+                        self.round_fetched += added
+                        siblings[index] = document
+                        self.expanded += 1
+                        self.round_expanded += 1
+                        self.collect(next_frontier, document, depth, matched)
+                    if self.budget_reached:
+                        break
+            finally:
+                batches.close()
+            if self.budget_reached:
+                break
+
+        if self.budget_reached:
+            for entries in groups.values():
+                next_frontier.extend(entries.values())
+        return next_frontier
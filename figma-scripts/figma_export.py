@@ -0,0 +1,73 @@
+"""Content-addressed manifest for incremental frame exports.
+
+The manifest lives in the export directory and records, for every written
+image, the file version it was rendered at, a hash of the node's subtree and
+the sha256 of the image itself. A re-run only renders nodes whose subtree
+hash changed or whose image is missing or was modified on disk; when the
+file version is unchanged even the subtree lookup is skipped.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+
+MANIFEST_NAME = '.figma-export.json'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class ExportManifest:
+    """Per-directory record of exported images, keyed by output filename."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('images', {})
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'images': self.entries}, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def intact_entry(self, filename, scale):
+        """Return the entry for filename if the image on disk is still the one recorded."""
+        entry = self.entries.get(filename)
+        if not entry or entry.get('scale') != scale:
+            return None
+        if file_sha256(os.path.join(self.output_dir, filename)) != entry.get('sha256'):
+            return None
+        return entry
+
+    def record(self, filename, node_id, version, node_hash, scale, sha256):
+        self.entries[filename] = {
+            'nodeId': node_id,
+            'version': version,
+            'hash': node_hash,
+            'scale': scale,
+            'sha256': sha256,
+        }
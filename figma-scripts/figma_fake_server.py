@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Figma REST API, for benchmarks.
+
+Serves a synthetic file of configurable size and shape through the
+endpoints the scripts use: /v1/files (with depth), /files/{key}/nodes,
+/components, /styles, /versions and /images, plus the rendered images
+themselves. Every page is a complete tree with the given fanout, so a low
+fanout gives deep trees and a high one wide trees. Nodes are generated on
+demand from their ID, so even a 1M-node file only keeps the serialised full
+document on disk. Responses are gzip-compressed for clients that ask for it
+(unless compression is turned off), latency and 429 responses can be
+injected, image downloads honour Range and can be cut short or stalled,
+and the server counts requests and bytes on the wire so a
+benchmark can report them.
+
+Run it standalone to point the scripts at it:
+
+    python3 figma_fake_server.py --nodes 100000 --port 8765
+    FIGMA_API_BASE=http://127.0.0.1:8765/v1 FIGMA_ACCESS_TOKEN=fake python3 figma-styles.py BENCH
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FONTS = ('Inter', 'Roboto Mono', 'Source Serif Pro')
+PALETTE_SIZE = 24
+STYLE_COUNT = 8
+WRITE_SIZE = 64 * 1024
+# Bodies smaller than this are sent uncompressed, as most servers do
+MIN_COMPRESS_BYTES = 1024
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class SyntheticFile:
+    """A deterministic Figma document whose nodes are computed from their IDs.
+
+    The document holds pages pages; node j of page p has ID "{p}:{j}" (the
+    page itself is j=0) and children j*fanout+1 .. j*fanout+fanout, so the
+    whole tree is implicit and any subtree can be serialised on request.
+    Style definitions live outside the tree as nodes "0:1" .. "0:{STYLE_COUNT}".
+    """
+
+    def __init__(self, nodes=10000, pages=4, fanout=8, version=1):
+        self.pages = max(1, pages)
+        self.fanout = max(1, fanout)
+        # Nodes per page, not counting the page itself
+        self.per_page = max(1, (nodes - 1) // self.pages - 1)
+        self.version = version
+
+    @property
+    def node_count(self):
+        return 1 + self.pages * (self.per_page + 1)
+
+    def children(self, j):
+        first = j * self.fanout + 1
+        return range(first, min(first + self.fanout, self.per_page + 1))
+
+    def parse_id(self, node_id):
+        """Return (page, j) for a node ID, (0, 0) for the document, or None."""
+        try:
+            page, j = (int(part) for part in node_id.split(':'))
+        except ValueError:
+            return None
+        if (page == 0 and 0 <= j <= STYLE_COUNT) or (1 <= page <= self.pages and 0 <= j <= self.per_page):
+            return page, j
+        return None
+
+    def color(self, index):
+        shade = (index % PALETTE_SIZE) / PALETTE_SIZE
+        return {'r': round(shade, 4), 'g': round(1 - shade, 4), 'b': 0.5, 'a': 1}
+
+    def style_id(self, index):
+        return f"0:{index + 1}"
+
+    def props(self, page, j):
+        """Return a node's properties without children."""
+        if page == 0 and j:
+            return {
+                'id': self.style_id(j - 1), 'name': f'Color/{j - 1}', 'type': 'RECTANGLE',
+                'fills': [{'type': 'SOLID', 'color': self.color(j - 1)}],
+            }
+        if page == 0:
+            return {'id': '0:0', 'name': 'Document', 'type': 'DOCUMENT'}
+        node_id = f"{page}:{j}"
+        if j == 0:
+            return {
+                'id': node_id, 'name': f'Page {page}', 'type': 'CANVAS',
+                'backgroundColor': {'r': 1, 'g': 1, 'b': 1, 'a': 1},
+            }
+        box = {'x': j % 1000, 'y': j // 1000, 'width': 100, 'height': 40}
+        if not self.children(j):
+            node = {
+                'id': node_id, 'name': f'Text {j}', 'type': 'TEXT',
+                'absoluteBoundingBox': box,
+                'characters': f'Label {j}',
+                'style': {
+                    'fontFamily': FONTS[j % len(FONTS)], 'fontWeight': 400 + 100 * (j % 4),
+                    'fontSize': 12 + 2 * (j % 6), 'lineHeightPx': 16 + 2 * (j % 6), 'letterSpacing': 0,
+                },
+                'fills': [{'type': 'SOLID', 'color': self.color(j)}],
+            }
+            if j % 3 == 0:
+                # Styled text takes its fill from the style
+                node['fills'] = [{'type': 'SOLID', 'color': self.color(j % STYLE_COUNT)}]
+                node['styles'] = {'fill': self.style_id(j % STYLE_COUNT)}
+        else:
+            node_type = 'COMPONENT' if j % 50 == 1 else 'INSTANCE' if j % 50 == 2 else 'FRAME'
+            node = {
+                'id': node_id, 'name': f'Frame {j}', 'type': node_type,
+                'absoluteBoundingBox': box,
+                'fills': [{'type': 'SOLID', 'color': self.color(j * 7)}],
+            }
+            if node_type == 'INSTANCE':
+                node['componentId'] = f"{page}:{j - 1}"
+            if j % 7 == 0:
+                node['effects'] = [{
+                    'type': 'DROP_SHADOW', 'visible': True, 'radius': 4,
+                    'color': {'r': 0, 'g': 0, 'b': 0, 'a': 0.25}, 'offset': {'x': 0, 'y': 2},
+                }]
+        if j % 97 == 0:
+            node['visible'] = False
+        return node
+
+    def node_children(self, page, j):
+        if page == 0 and j:
+            return []
+        if page == 0:
+            return [(p, 0) for p in range(1, self.pages + 1)]
+        return [(page, child) for child in self.children(j)]
+
+    def iter_json(self, page, j, max_depth=None):
+        """Yield the JSON text of a subtree in pieces, down to max_depth levels below it."""
+        stack = [(page, j, 0)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                yield item
+                continue
+            page, j, depth = item
+            text = _encode(self.props(page, j))
+            children = self.node_children(page, j)
+            if not children or (max_depth is not None and depth >= max_depth):
+                yield text
+                continue
+            yield text[:-1] + ',"children":['
+            stack.append(']}')
+            for i, (child_page, child) in enumerate(reversed(children)):
+                stack.append((child_page, child, depth + 1))
+                if i < len(children) - 1:
+                    stack.append(',')
+
+    def components(self):
+        """Return (node_id, name, page) for every COMPONENT node."""
+        found = []
+        for page in range(1, self.pages + 1):
+            for j in range(1, self.per_page + 1, 50):
+                if self.children(j):
+                    found.append((f"{page}:{j}", f'Frame {j}', f'Page {page}'))
+        return found
+
+    def meta(self):
+        return {'name': 'Benchmark File', 'lastModified': f'2024-01-01T00:00:{self.version % 60:02d}Z',
+                'version': str(self.version), 'schemaVersion': 0, 'role': 'viewer'}
+
+    def style_map(self):
+        return {
+            self.style_id(i): {'key': f'style{i}', 'name': f'Color/{i}', 'styleType': 'FILL', 'description': ''}
+            for i in range(STYLE_COUNT)
+        }
+
+    def iter_file(self, max_depth=None):
+        """Yield the /v1/files response text in pieces."""
+        yield _encode(self.meta())[:-1] + ',"document":'
+        yield from self.iter_json(0, 0, max_depth)
+        components = {
+            node_id: {'key': node_id, 'name': name, 'description': '', 'remote': False}
+            for node_id, name, _ in self.components()
+        }
+        yield ',"components":' + _encode(components) + ',"styles":' + _encode(self.style_map()) + '}'
+
+    def iter_nodes(self, node_ids, max_depth=None):
+        """Yield the /v1/files/{key}/nodes response text in pieces."""
+        yield _encode(self.meta())[:-1] + ',"nodes":{'
+        for i, node_id in enumerate(node_ids):
+            yield ('' if i == 0 else ',') + _encode(node_id) + ':'
+            location = self.parse_id(node_id)
+            if location is None:
+                yield 'null'
+                continue
+            yield '{"document":'
+            yield from self.iter_json(*location, max_depth)
+            yield ',"components":{},"styles":{}}'
+        yield '}}'
+
+
+def batched(pieces, size=WRITE_SIZE):
+    """Join small text pieces into UTF-8 chunks of roughly size bytes."""
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of byte chunks incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class FakeFigmaServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the synthetic file, fault settings and counters."""
+
+    daemon_threads = True
+
+    def __init__(self, address, synthetic, latency=0.0, throttle_every=0, retry_after=0.2, image_bytes=20000,
+                 compression=True, drop_every=0, stall_every=0, stall_seconds=5.0):
+        # Set before binding, since a failed bind calls server_close
+        self.workdir = tempfile.mkdtemp(prefix='figma-fake-')
+        super().__init__(address, FakeFigmaHandler)
+        self.synthetic = synthetic
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        # Patterned, so a download resumed at the wrong offset changes its hash
+        self.image = (b'\x89PNG' + bytes(range(256)) * (image_bytes // 256 + 1))[:max(4, image_bytes)]
+        self.compression = compression
+        self.drop_every = drop_every
+        self.stall_every = stall_every
+        self.stall_seconds = stall_seconds
+        self.lock = threading.Lock()
+        self.document_paths = {}
+        # Counts toward throttle_every across stats resets
+        self.throttle_count = 0
+        self.image_count = 0
+        self.reset_stats()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'api_requests': 0, 'throttled': 0, 'dropped': 0, 'stalled': 0, 'bytes_sent': 0,
+                          'connections': 0, 'endpoints': {}}
+
+    def snapshot_stats(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+            return self.stats[key]
+
+    def full_document(self, gzipped=False):
+        """Return the path of the serialised (optionally gzipped) full document, writing it on first use."""
+        with self.lock:
+            if gzipped not in self.document_paths:
+                suffix = '.json.gz' if gzipped else '.json'
+                path = os.path.join(self.workdir, f'document-{self.synthetic.version}{suffix}')
+                chunks = batched(self.synthetic.iter_file())
+                with open(path, 'wb') as f:
+                    for chunk in (gzip_chunks(chunks) if gzipped else chunks):
+                        f.write(chunk)
+                self.document_paths[gzipped] = path
+            return self.document_paths[gzipped]
+
+    def bump_version(self):
+        with self.lock:
+            self.synthetic.version += 1
+            self.document_paths = {}
+            return self.synthetic.version
+
+    def server_close(self):
+        super().server_close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class FakeFigmaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def wants_gzip(self):
+        accepted = self.headers.get('Accept-Encoding', '')
+        return self.server.compression and 'gzip' in [value.split(';')[0].strip() for value in accepted.split(',')]
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        headers = dict(headers or {})
+        if content_type == 'application/json' and len(body) >= MIN_COMPRESS_BYTES and self.wants_gzip():
+            body = b''.join(gzip_chunks([body]))
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count('bytes_sent', len(body))
+
+    def send_json(self, data, status=200):
+        self.send_body(status, json.dumps(data).encode('utf-8'))
+
+    def send_chunks(self, chunks):
+        """Send a generated body with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        if self.wants_gzip():
+            self.send_header('Content-Encoding', 'gzip')
+            chunks = gzip_chunks(chunks)
+        self.end_headers()
+        for chunk in chunks:
+            if not chunk:
+                continue
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.server.count('bytes_sent', len(chunk))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def send_document(self):
+        """Send the full document from disk, gzipped if the client accepts it."""
+        gzipped = self.wants_gzip()
+        path = self.server.full_document(gzipped)
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, WRITE_SIZE)
+        self.server.count('bytes_sent', size)
+
+    def send_image(self):
+        """Send a rendered image, honouring 'Range: bytes=N-' and injecting drops and stalls.
+
+        A dropped response is closed halfway through its body; a stalled
+        one sends half and then waits stall_seconds before the rest.
+        """
+        server = self.server
+        image = server.image
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        start = int(match.group(1)) if match else 0
+        if start >= len(image):
+            return self.send_body(416, b'', 'text/plain', {'Content-Range': f"bytes */{len(image)}"})
+        with server.lock:
+            server.image_count += 1
+            drop = server.drop_every and server.image_count % server.drop_every == 0
+            stall = server.stall_every and server.image_count % server.stall_every == 0
+        body = image[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        if start:
+            self.send_header('Content-Range', f"bytes {start}-{len(image) - 1}/{len(image)}")
+        self.end_headers()
+        half = len(body) // 2
+        if drop or stall:
+            self.wfile.write(body[:half])
+            self.wfile.flush()
+            server.count('bytes_sent', half)
+            if drop:
+                server.count('dropped')
+                self.close_connection = True
+                return
+            server.count('stalled')
+            time.sleep(server.stall_seconds)
+            body = body[half:]
+        try:
+            self.wfile.write(body)
+            server.count('bytes_sent', len(body))
+        except OSError:
+            # The client gave up on a stalled response
+            self.close_connection = True
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = url.path.strip('/').split('/')
+        server.count('requests')
+
+        # Control endpoints, never delayed or throttled
+        if parts[0] == '__stats':
+            return self.send_json(server.snapshot_stats())
+        if parts[0] == '__reset':
+            server.reset_stats()
+            return self.send_json({'ok': True})
+        if parts[0] == '__bump':
+            return self.send_json({'version': str(server.bump_version())})
+        if parts[0] == '__img':
+            return self.send_image()
+
+        if parts[0] != 'v1' or len(parts) < 3:
+            return self.send_json({'status': 404, 'err': 'Not found'}, 404)
+        endpoint = parts[1] if parts[1] == 'images' else '/'.join(['files'] + parts[3:4])
+        with server.lock:
+            server.stats['endpoints'][endpoint] = server.stats['endpoints'].get(endpoint, 0) + 1
+        server.count('api_requests')
+        with server.lock:
+            server.throttle_count += 1
+            throttle = server.throttle_every and server.throttle_count % server.throttle_every == 0
+        if server.latency:
+            time.sleep(server.latency)
+        if throttle:
+            server.count('throttled')
+            return self.send_body(
+                429, b'{"status":429,"err":"Rate limit exceeded"}',
+                headers={'Retry-After': str(server.retry_after)},
+            )
+
+        synthetic = server.synthetic
+        depth = int(query['depth']) if query.get('depth') else None
+        if parts[1] == 'images':
+            ids = [node_id for node_id in query.get('ids', '').split(',') if node_id]
+            export_format = query.get('format', 'png')
+            host = self.headers.get('Host')
+            images = {
+                node_id: (
+                    f"http://{host}/__img/{node_id.replace(':', '-')}.{export_format}"
+                    if synthetic.parse_id(node_id) else None
+                )
+                for node_id in ids
+            }
+            return self.send_json({'err': None, 'images': images})
+        if len(parts) == 3:
+            # Depth-limited listings are generated; the full document is served from disk
+            if depth is None:
+                return self.send_document()
+            return self.send_chunks(batched(synthetic.iter_file(depth)))
+        if parts[3] == 'nodes':
+            ids = [node_id for node_id in query.get('ids', '').split(',') if node_id]
+            return self.send_chunks(batched(synthetic.iter_nodes(ids, depth)))
+        if parts[3] == 'components':
+            components = [
+                {'key': node_id, 'node_id': node_id, 'name': name, 'description': '',
+                 'containing_frame': {'pageName': page} if i % 2 else {}}
+                for i, (node_id, name, page) in enumerate(synthetic.components())
+            ]
+            return self.send_json({'status': 200, 'error': False, 'meta': {'components': components}})
+        if parts[3] == 'styles':
+            styles = [
+                {'key': meta['key'], 'node_id': style_id, 'name': meta['name'],
+                 'style_type': meta['styleType'], 'description': meta['description']}
+                for style_id, meta in synthetic.style_map().items()
+            ]
+            return self.send_json({'status': 200, 'error': False, 'meta': {'styles': styles}})
+        if parts[3] == 'versions':
+            versions = [
+                {'id': str(version), 'created_at': '2024-01-01T00:00:00Z', 'label': None}
+                for version in range(synthetic.version, 0, -1)
+            ]
+            return self.send_json({'versions': versions})
+        return self.send_json({'status': 404, 'err': 'Not found'}, 404)
+
+
+def start_server(synthetic, host='127.0.0.1', port=0, **options):
+    """Start a FakeFigmaServer on a background thread and return it."""
+    server = FakeFigmaServer((host, port), synthetic, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_server_arguments(parser):
+    """Add the synthetic file and fault injection options to a parser."""
+    parser.add_argument('--nodes', type=int, default=10000, help='Approximate node count of the synthetic file (default: 10000)')
+    parser.add_argument('--pages', type=int, default=4, help='Number of pages (default: 4)')
+    parser.add_argument('--fanout', type=int, default=8, help='Children per node; low values give deep trees, high values wide ones (default: 8)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of delay added to every API request (default: 0)')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth API request with 429 (default: never)')
+    parser.add_argument('--retry-after', type=float, default=0.2, help='Retry-After seconds sent with injected 429s (default: 0.2)')
+    parser.add_argument('--no-compression', action='store_true', help='Ignore Accept-Encoding and always send uncompressed bodies')
+    parser.add_argument('--image-bytes', type=int, default=20000, help='Size of each rendered image (default: 20000)')
+    parser.add_argument('--drop-every', type=int, default=0, help='Cut every Nth image download off halfway through (default: never)')
+    parser.add_argument('--stall-every', type=int, default=0, help='Pause every Nth image download halfway through (default: never)')
+    parser.add_argument('--stall-seconds', type=float, default=5.0, help='Length of an injected stall (default: 5)')
+
+
+def server_options(args):
+    """Return start_server keyword options from parsed arguments."""
+    return {
+        'latency': args.latency,
+        'throttle_every': args.throttle_every,
+        'retry_after': args.retry_after,
+        'image_bytes': args.image_bytes,
+        'compression': not args.no_compression,
+        'drop_every': args.drop_every,
+        'stall_every': args.stall_every,
+        'stall_seconds': args.stall_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a synthetic Figma file through a local stand-in of the Figma REST API'
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    add_server_arguments(parser)
+
+    args = parser.parse_args()
+
+    try:
+        synthetic = SyntheticFile(args.nodes, args.pages, args.fanout)
+        server = FakeFigmaServer((args.host, args.port), synthetic, **server_options(args))
+        print(f"Serving {synthetic.node_count:,} nodes at {server.base_url} (any file key, any token)")
+        print(f"Counters: http://{args.host}:{server.server_address[1]}/__stats")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
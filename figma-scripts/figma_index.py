@@ -0,0 +1,287 @@
+"""Local SQLite index of every node in a Figma file.
+
+build_index walks a file once and records each node's parent, page, type,
+name, visibility, font and style references. Lookups such as "all TEXT nodes
+using font X on page Y" or "where is component Z used" then run against the
+local database in milliseconds, without touching the network.
+"""
+import os
+import sqlite3
+
+from figma_cache import CACHE_DIR, fetch_file_document, open_file_document, probe_version
+from figma_compact import INDEX_FIELDS
+from figma_stream import NodeStream, walk_stream
+from figma_tree import walk
+
+
+INDEX_PATH = os.environ.get('FIGMA_INDEX_PATH', os.path.join(CACHE_DIR, 'nodes.sqlite'))
+INSERT_BATCH = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_key TEXT PRIMARY KEY,
+    name TEXT,
+    version TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    file_key TEXT NOT NULL,
+    id TEXT NOT NULL,
+    parent_id TEXT,
+    page TEXT,
+    type TEXT,
+    name TEXT,
+    visible INTEGER,
+    depth INTEGER,
+    ord INTEGER,
+    font_family TEXT,
+    component_id TEXT,
+    PRIMARY KEY (file_key, id)
+);
+CREATE TABLE IF NOT EXISTS style_refs (
+    file_key TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    style_type TEXT,
+    style_id TEXT
+);
+CREATE TABLE IF NOT EXISTS styles (
+    file_key TEXT NOT NULL,
+    style_id TEXT NOT NULL,
+    name TEXT,
+    style_type TEXT,
+    PRIMARY KEY (file_key, style_id)
+);
+CREATE TABLE IF NOT EXISTS components (
+    file_key TEXT NOT NULL,
+    component_id TEXT NOT NULL,
+    name TEXT,
+    remote INTEGER,
+    PRIMARY KEY (file_key, component_id)
+);
+CREATE INDEX IF NOT EXISTS nodes_type ON nodes (file_key, type);
+CREATE INDEX IF NOT EXISTS nodes_name ON nodes (file_key, name);
+CREATE INDEX IF NOT EXISTS nodes_page ON nodes (file_key, page);
+CREATE INDEX IF NOT EXISTS nodes_ord ON nodes (file_key, ord);
+CREATE INDEX IF NOT EXISTS nodes_component ON nodes (file_key, component_id);
+CREATE INDEX IF NOT EXISTS style_refs_style ON style_refs (file_key, style_id);
+CREATE INDEX IF NOT EXISTS style_refs_node ON style_refs (file_key, node_id);
+"""
+
+NODE_COLUMNS = ('id', 'parent_id', 'page', 'type', 'name', 'visible', 'depth', 'ord', 'font_family', 'component_id')
+
+
+def open_index(path=INDEX_PATH):
+    """Open (creating if needed) the node index database."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def indexed_version(conn, file_key):
+    """Return the version the file was last indexed at, or None."""
+    row = conn.execute("SELECT version FROM files WHERE file_key = ?", (file_key,)).fetchone()
+    return row['version'] if row else None
+
+
+def indexed_file(conn, file_key):
+    """Return the indexed file's metadata as a dict in API field names; raise if not indexed."""
+    row = conn.execute("SELECT * FROM files WHERE file_key = ?", (file_key,)).fetchone()
+    if row is None:
+        raise Exception(f"File {file_key} is not indexed; run figma-index.py build {file_key} first")
+    return {'name': row['name'], 'version': row['version'], 'lastModified': row['last_modified']}
+
+
+class IndexWriter:
+    """figma_tree visitor inserting every node into the index in batches."""
+
+    def __init__(self, conn, file_key):
+        self.conn = conn
+        self.file_key = file_key
+        self.node_rows = []
+        self.style_rows = []
+        self.count = 0
+
+    def enter(self, node, depth, ancestors, order):
+        node_id = node.get('id')
+        if node_id is None:
+            return
+        page = None
+        if node.get('type') == 'CANVAS':
+            page = node.get('name')
+        else:
+            for ancestor in ancestors:
+                if ancestor.get('type') == 'CANVAS':
+                    page = ancestor.get('name')
+                    break
+
+        style = node.get('style') or {}
+        self.node_rows.append((
+            self.file_key,
+            node_id,
+            ancestors[-1].get('id') if ancestors else None,
+            page,
+            node.get('type'),
+            node.get('name'),
+            0 if node.get('visible', True) is False else 1,
+            depth,
+            order,
+            style.get('fontFamily'),
+            node.get('componentId'),
+        ))
+        for style_type, style_id in (node.get('styles') or {}).items():
+            self.style_rows.append((self.file_key, node_id, style_type, style_id))
+
+        self.count += 1
+        if len(self.node_rows) >= INSERT_BATCH:
+            self.flush()
+
+    def flush(self):
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO nodes (file_key, {', '.join(NODE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (len(NODE_COLUMNS) + 1))})",
+            self.node_rows,
+        )
+        self.conn.executemany(
+            "INSERT INTO style_refs (file_key, node_id, style_type, style_id) VALUES (?, ?, ?, ?)",
+            self.style_rows,
+        )
+        self.node_rows = []
+        self.style_rows = []
+
+
+def begin_file(conn, file_key):
+    """Start re-indexing a file: drop its old rows and return an IndexWriter."""
+    for table in ('nodes', 'style_refs', 'styles', 'components'):
+        conn.execute(f"DELETE FROM {table} WHERE file_key = ?", (file_key,))
+    return IndexWriter(conn, file_key)
+
+
+def finish_file(conn, writer, meta):
+    """Flush remaining rows and record file metadata, named styles and components."""
+    writer.flush()
+    conn.executemany(
+        "INSERT OR REPLACE INTO components (file_key, component_id, name, remote) VALUES (?, ?, ?, ?)",
+        [
+            (writer.file_key, component_id, component.get('name'), 1 if component.get('remote') else 0)
+            for component_id, component in (meta.get('components') or {}).items()
+        ],
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO styles (file_key, style_id, name, style_type) VALUES (?, ?, ?, ?)",
+        [
+            (writer.file_key, style_id, style.get('name'), style.get('styleType'))
+            for style_id, style in (meta.get('styles') or {}).items()
+        ],
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO files (file_key, name, version, last_modified) VALUES (?, ?, ?, ?)",
+        (writer.file_key, meta.get('name'), meta.get('version'), meta.get('lastModified')),
+    )
+    conn.commit()
+
+
+def build_index(conn, file_key, token, stream=False, use_cache=True, refresh=False):
+    """Index every node of a file unless the index is already at its current version.
+
+    Returns the number of nodes indexed, or None when the index was up to date.
+    """
+    if not refresh and indexed_version(conn, file_key) is not None:
+        version, _ = probe_version(file_key, token)
+        if version == indexed_version(conn, file_key):
+            return None
+
+    writer = begin_file(conn, file_key)
+    if stream:
+        with open_file_document(file_key, token, use_cache=use_cache, refresh=refresh) as f:
+            node_stream = NodeStream(f)
+            walk_stream(node_stream, [writer])
+        meta = node_stream.meta
+    else:
+        meta = fetch_file_document(file_key, token, use_cache=use_cache, refresh=refresh, fields=INDEX_FIELDS)
+        document = meta.get('document')
+        if document:
+            walk(document, [writer])
+    finish_file(conn, writer, meta)
+    return writer.count
+
+
+def query_nodes(conn, file_key, node_id=None, node_type=None, name=None, page=None, font=None,
+                style=None, component=None, visible=None, limit=None):
+    """Return node rows matching every given filter, in document order.
+
+    name is a glob pattern. style matches a style ID or a named style.
+    component returns the instances of a component given by ID or name.
+    """
+    clauses = ["n.file_key = ?"]
+    params = [file_key]
+    if node_id:
+        clauses.append("n.id = ?")
+        params.append(node_id)
+    if node_type:
+        clauses.append("n.type = ?")
+        params.append(node_type.upper())
+    if name:
+        clauses.append("n.name GLOB ?")
+        params.append(name)
+    if page:
+        clauses.append("n.page = ?")
+        params.append(page)
+    if font:
+        clauses.append("n.font_family = ?")
+        params.append(font)
+    if visible is not None:
+        clauses.append("n.visible = ?")
+        params.append(1 if visible else 0)
+    if style:
+        clauses.append(
+            "n.id IN (SELECT r.node_id FROM style_refs r LEFT JOIN styles s "
+            "ON s.file_key = r.file_key AND s.style_id = r.style_id "
+            "WHERE r.file_key = ? AND (r.style_id = ? OR s.name = ?))"
+        )
+        params.extend([file_key, style, style])
+    if component:
+        clauses.append(
+            "n.component_id IN (SELECT c.component_id FROM components c WHERE c.file_key = ? "
+            "AND (c.component_id = ? OR c.name = ?))"
+        )
+        params.extend([file_key, component, component])
+
+    sql = f"SELECT n.* FROM nodes n WHERE {' AND '.join(clauses)} ORDER BY n.ord"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def page_names_for(conn, file_key, node_ids):
+    """Map the given node IDs to their page names."""
+    pages = {}
+    node_ids = list(node_ids)
+    # Stay under SQLite's bound parameter limit
+    for i in range(0, len(node_ids), 500):
+        batch = node_ids[i:i + 500]
+        rows = conn.execute(
+            f"SELECT id, page FROM nodes WHERE file_key = ? AND id IN ({', '.join('?' * len(batch))})",
+            [file_key] + batch,
+        )
+        for row in rows:
+            if row['page']:
+                pages[row['id']] = row['page']
+    return pages
+
+
+def iter_tree(conn, file_key, max_depth=None):
+    """Yield indexed nodes as dicts in document order, down to max_depth."""
+    sql = "SELECT * FROM nodes WHERE file_key = ?"
+    params = [file_key]
+    if max_depth is not None:
+        sql += " AND depth <= ?"
+        params.append(max_depth)
+    for row in conn.execute(sql + " ORDER BY ord", params):
+        node = dict(row)
+        node['visible'] = bool(node['visible'])
+        yield node
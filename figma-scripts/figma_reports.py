@@ -0,0 +1,163 @@
+"""Text reports printed by figma-file.py, figma-styles.py and figma-components.py.
+
+Kept apart from the scripts so figma-analyze.py can write all three from a
+single fetch and walk of the document.
+"""
+from figma_timings import phase
+from figma_tokens import cluster_colors, cluster_effects
+
+
+def write_file_header(out, file_key, data):
+    """Write the file information banner."""
+    out.write("=" * 80 + "\n")
+    out.write(f"FILE: {data.get('name', 'Unknown')}\n")
+    out.write(f"Key: {file_key}\n")
+    out.write(f"Last Modified: {data.get('lastModified', 'N/A')}\n")
+    out.write(f"Version: {data.get('version', 'N/A')}\n")
+    out.write("=" * 80 + "\n\n")
+
+
+def format_uses(count):
+    """Format a usage count for display."""
+    return f"{count:,} use" if count == 1 else f"{count:,} uses"
+
+
+def print_aliases(entry, out, limit=10):
+    """Print the values merged into a clustered token, if any."""
+    aliases = entry[3] if len(entry) > 3 else []
+    if not aliases:
+        return
+    shown = ', '.join(f"{alias} ({format_uses(count)})" for alias, count in aliases[:limit])
+    more = f", and {len(aliases) - limit:,} more" if len(aliases) > limit else ''
+    print(f"     aliases: {shown}{more}", file=out)
+
+
+def print_style_name(collector, name, key, styles, out, aliases=()):
+    """Print the named style a token (or, when clustered, one of its aliases) was applied with."""
+    for candidate in (key, *(alias for alias, _ in aliases)):
+        style_name = collector.style_name(name, candidate, styles)
+        if style_name:
+            print(f"     style: {style_name}", file=out)
+            return
+
+
+def write_styles_report(out, file_key, data, collector, published, cluster=None):
+    """Print the tokens a StyleCollector gathered, clustering colors within ΔE cluster if given."""
+    colors = collector.colors
+    text_styles = collector.text_styles
+    effects_list = collector.effects
+    if cluster is not None:
+        with phase('cluster'):
+            colors = cluster_colors(collector.colors, cluster)
+            effects_list = cluster_effects(collector.effects, colors)
+    styles = data.get('styles') or {}
+    
+    with phase('output'):
+        # Print results
+        print("=" * 80, file=out)
+        print(f"STYLES FROM: {data.get('name', 'Unknown')}", file=out)
+        print(f"Key: {file_key}", file=out)
+        print("=" * 80, file=out)
+        print(file=out)
+        
+        # Print colors
+        print("COLORS:", file=out)
+        print("-" * 80, file=out)
+        if cluster is not None:
+            print(f"  {len(collector.colors):,} distinct colors merged into {len(colors):,} within ΔE {cluster:g}", file=out)
+        if colors:
+            for i, (key, entry) in enumerate(colors.items(), 1):
+                print(f"  {i}. {entry[0]} ({format_uses(entry[1])})", file=out)
+                print_style_name(collector, 'colors', key, styles, out, entry[3] if len(entry) > 3 else ())
+                print_aliases(entry, out)
+        else:
+            print("  No colors found", file=out)
+        print(file=out)
+        
+        # Print text styles
+        print("TEXT STYLES:", file=out)
+        print("-" * 80, file=out)
+        if text_styles:
+            for i, (token_key, (style, count, _)) in enumerate(text_styles.items(), 1):
+                print(f"  {i}. {style.get('name', 'Unnamed')} ({format_uses(count)})", file=out)
+                print_style_name(collector, 'text_styles', token_key, styles, out)
+                for key, value in style.items():
+                    if key != 'name':
+                        print(f"     {key}: {value}", file=out)
+                print(file=out)
+        else:
+            print("  No text styles found", file=out)
+        print(file=out)
+        
+        # Print effects
+        print("EFFECTS:", file=out)
+        print("-" * 80, file=out)
+        if effects_list:
+            for i, (token_key, entry) in enumerate(effects_list.items(), 1):
+                effect = entry[0]
+                print(f"  {i}. Type: {effect.get('type')} ({format_uses(entry[1])})", file=out)
+                print_style_name(collector, 'effects', token_key, styles, out)
+                for key, value in effect.items():
+                    if key != 'type':
+                        print(f"     {key}: {value}", file=out)
+                print_aliases(entry, out)
+                print(file=out)
+        else:
+            print("  No effects found", file=out)
+        print(file=out)
+        
+        # Print published styles metadata
+        print("PUBLISHED STYLES:", file=out)
+        print("-" * 80, file=out)
+        if published:
+            for style_meta in published:
+                print(f"  • {style_meta.get('name', 'Unnamed')}", file=out)
+                print(f"    Type: {style_meta.get('style_type', 'N/A')}", file=out)
+                print(f"    Description: {style_meta.get('description', 'N/A')}", file=out)
+                print(file=out)
+        else:
+            print("  No published styles found", file=out)
+
+
+def write_components_report(out, file_key, file_data, components, page_names):
+    """Print the published components with the pages they were found on."""
+    with phase('output'):
+        print("=" * 80, file=out)
+        print(f"COMPONENTS FROM: {file_data.get('name', 'Unknown')}", file=out)
+        print(f"Key: {file_key}", file=out)
+        print(f"Total Components: {len(components)}", file=out)
+        print("=" * 80, file=out)
+        print(file=out)
+        
+        if not components:
+            print("No components found in this file", file=out)
+            return
+        
+        # Print each component
+        for i, comp_data in enumerate(components, 1):
+            name = comp_data.get('name', 'Unnamed')
+            description = comp_data.get('description', '')
+            node_id = comp_data.get('node_id', '')
+            containing_frame = comp_data.get('containing_frame', {})
+            
+            # Try to find the page
+            page_name = page_names.get(node_id, 'Unknown Page')
+            
+            # If we have containing_frame info, use that
+            if containing_frame and 'pageName' in containing_frame:
+                page_name = containing_frame['pageName']
+            
+            print(f"{i}. {name}", file=out)
+            print(f"   ID: {node_id}", file=out)
+            print(f"   Node ID: {node_id}", file=out)
+            print(f"   Page: {page_name}", file=out)
+            
+            if description:
+                print(f"   Description: {description}", file=out)
+            
+            if containing_frame:
+                frame_name = containing_frame.get('name', 'N/A')
+                if frame_name and frame_name != 'N/A':
+                    print(f"   Containing Frame: {frame_name}", file=out)
+            
+            print(file=out)
@@ -0,0 +1,222 @@
+"""Incremental parsing of large Figma API responses.
+
+NodeStream reads a /v1/files (or /v1/files/{key}/nodes) response from any
+binary file object and yields document nodes while the body is still
+arriving, so the whole tree never has to be held in memory. Only the
+structure along document -> children -> ... is parsed by hand; every other
+value (fills, styles, top-level metadata) goes through json's C decoder.
+"""
+import codecs
+import json
+import time
+from collections import namedtuple
+
+from figma_timings import get_timings
+
+
+READ_SIZE = 256 * 1024
+
+StreamedNode = namedtuple('StreamedNode', ['node', 'ancestors', 'order'])
+StreamedNode.__doc__ = """A parsed node without its children, its enclosing nodes and its pre-order position."""
+
+# Roles of the containers the parser walks by hand
+_TOP, _NODES_MAP, _NODES_ENTRY, _NODE, _CHILDREN = range(5)
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER_END = _WHITESPACE + ',}]'
+
+
+def _child_role(role, key):
+    """Return the role of the container stored under key, or None for a plain value."""
+    if role == _TOP:
+        return {'document': _NODE, 'nodes': _NODES_MAP}.get(key)
+    if role == _NODES_MAP:
+        return _NODES_ENTRY
+    if role == _NODES_ENTRY:
+        return _NODE if key == 'document' else None
+    if role == _NODE:
+        return _CHILDREN if key == 'children' else None
+    return None
+
+
+class _Frame:
+    __slots__ = ('role', 'target', 'first', 'order')
+
+    def __init__(self, role, target=None, order=None):
+        self.role = role
+        self.target = target
+        self.first = True
+        self.order = order
+
+
+class _Reader:
+    """Decoded text buffer over a binary stream, refilled on demand."""
+
+    def __init__(self, fp, read_size):
+        self.fp = fp
+        self.read_size = read_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def fill(self):
+        """Append more input to the buffer, growing reads with the unparsed tail."""
+        if self.eof:
+            return False
+        pending = len(self.buf) - self.pos
+        chunk = self.fp.read(max(self.read_size, pending))
+        self.bytes_read += len(chunk)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk, final=not chunk)
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            buf = self.buf
+            pos = self.pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed JSON: expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value at the current position."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number cut by the end of the buffer decodes as its prefix
+                # ('0.' as 0), so it is only complete once a delimiter follows
+                complete = (
+                    self.eof
+                    or not isinstance(value, (int, float))
+                    or (end < len(self.buf) and self.buf[end] in _NUMBER_END)
+                )
+                if complete:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+class NodeStream:
+    """Iterate the nodes of a Figma document as they are parsed.
+
+    Each item is a StreamedNode whose node dict holds every property except
+    'children'. Nodes are yielded when their object closes, so children come
+    before their parent; order is the node's position in a pre-order walk,
+    for callers that need document order. ancestors are the enclosing
+    nodes, which carry the properties Figma sends before 'children' (id,
+    name, type).
+
+    After iteration, meta holds the top-level fields other than the
+    document, such as name, version and lastModified.
+    """
+
+    def __init__(self, fp, read_size=READ_SIZE):
+        self._reader = _Reader(fp, read_size)
+        self.meta = {}
+        self.node_count = 0
+
+    @property
+    def bytes_read(self):
+        return self._reader.bytes_read
+
+    def __iter__(self):
+        reader = self._reader
+        reader.expect('{')
+        stack = [_Frame(_TOP, self.meta)]
+        node_frames = []
+        order = 0
+
+        while stack:
+            frame = stack[-1]
+            closing = ']' if frame.role == _CHILDREN else '}'
+            if reader.peek() == closing:
+                reader.pos += 1
+                stack.pop()
+                if frame.role == _NODE:
+                    node_frames.pop()
+                    self.node_count += 1
+                    yield StreamedNode(frame.target, [f.target for f in node_frames], frame.order)
+                continue
+
+            if not frame.first:
+                reader.expect(',')
+            frame.first = False
+
+            if frame.role == _CHILDREN:
+                if reader.peek() == '{':
+                    reader.pos += 1
+                    child = _Frame(_NODE, {}, order)
+                    order += 1
+                    stack.append(child)
+                    node_frames.append(child)
+                else:
+                    reader.value()
+                continue
+
+            key = reader.value()
+            reader.expect(':')
+            role = _child_role(frame.role, key)
+            opening = '[' if role == _CHILDREN else '{'
+            if role is not None and reader.peek() == opening:
+                reader.pos += 1
+                child = _Frame(role, {} if role == _NODE else None, order)
+                if role == _NODE:
+                    order += 1
+                    node_frames.append(child)
+                stack.append(child)
+            else:
+                value = reader.value()
+                if frame.role in (_TOP, _NODE):
+                    frame.target[key] = value
+
+        # Read to EOF so a caching reader commits and the connection can be reused
+        while reader.fill():
+            pass
+
+
+def walk_stream(stream, visitors, max_depth=None, prune=None):
+    """Feed every streamed node to figma_tree-style visitors.
+
+    Mirrors figma_tree.walk, except that nodes arrive children-first, so a
+    visitor returning SKIP has no effect and visitors that care about
+    document order must sort by order themselves. prune(node) is applied to
+    each node and its ancestors. Returns the number of nodes visited.
+
+    The time is recorded as the 'stream' phase, which covers reading and
+    parsing the response as well as the visitors.
+    """
+    started = time.perf_counter()
+    visited = 0
+    for item in stream:
+        depth = len(item.ancestors)
+        if max_depth is not None and depth > max_depth:
+            continue
+        if prune is not None and (prune(item.node) or any(prune(a) for a in item.ancestors)):
+            continue
+        for visitor in visitors:
+            visitor.enter(item.node, depth, item.ancestors, item.order)
+        visited += 1
+    timings = get_timings()
+    timings.add_phase('stream', time.perf_counter() - started)
+    timings.count('nodes_visited', visited)
+    return visited
@@ -0,0 +1,113 @@
+"""Incremental per-page sync for repeated extraction runs.
+
+The snapshot store records, per file, the last synced version and, per page,
+a content hash plus the extraction results of each analysis that ran on it.
+When the file version is unchanged every page comes from the store and only
+the depth=1 probe is made. When it changed, pages are fetched through the
+nodes endpoint in parallel, and only pages whose content hash differs are
+re-extracted. The Figma API has no per-page modification stamp, so a new
+version still means fetching the pages to compare them.
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from figma_cache import CACHE_DIR, safe_filename
+from figma_client import API_BASE, iter_nodes, make_figma_request
+
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'snapshots')
+
+
+def page_hash(document):
+    """Stable content hash of a page subtree."""
+    canonical = json.dumps(document, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class SnapshotStore:
+    """One JSON state file per Figma file under the snapshot directory."""
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+
+    def path_for(self, file_key):
+        return os.path.join(self.root, f"{safe_filename(file_key)}.json")
+
+    def load(self, file_key):
+        """Return the stored state ({'version', 'pages': {...}}) or an empty one."""
+        try:
+            with open(self.path_for(file_key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'version': None, 'pages': {}}
+
+    def save(self, file_key, state):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path_for(file_key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def sync_pages(file_key, token, analysis, extract, concurrency=4, refresh=False, store=None, log=None):
+    """Run extract(page_document) on every page, reusing snapshots of unchanged pages.
+
+    extract must return a JSON-serialisable result; refresh ignores stored
+    snapshots and re-extracts every page. Returns (file_data,
+    results) where file_data is the depth=1 listing and results is a list of
+    (page_id, page_name, result) in document order.
+    """
+    store = store or SnapshotStore()
+    log = log or sys.stderr
+    file_data = make_figma_request(f"{API_BASE}/files/{file_key}?depth=1", token)
+    version = file_data.get('version')
+    pages = [
+        (page.get('id'), page.get('name', 'Unknown Page'))
+        for page in (file_data.get('document') or {}).get('children', [])
+        if page.get('type') == 'CANVAS'
+    ]
+
+    state = {'version': None, 'pages': {}} if refresh else store.load(file_key)
+    previous_version = state.get('version')
+    old_pages = state.get('pages', {})
+
+    if version and version == previous_version:
+        # Same version: only pages this analysis has never seen need fetching
+        to_fetch = [page_id for page_id, _ in pages if analysis not in old_pages.get(page_id, {}).get('results', {})]
+    else:
+        to_fetch = [page_id for page_id, _ in pages]
+        if previous_version:
+            print(f"Incremental sync: version {previous_version} -> {version}, comparing every page", file=log)
+
+    new_pages = {page_id: old_pages[page_id] for page_id, _ in pages if page_id in old_pages}
+    changed = 0
+    for batch in iter_nodes(file_key, to_fetch, token, batch_size=1, concurrency=concurrency):
+        for page_id, document in batch.items():
+            if not document:
+                continue
+            digest = page_hash(document)
+            entry = new_pages.get(page_id)
+            if entry is None or entry.get('hash') != digest:
+                entry = {'hash': digest, 'results': {}}
+                new_pages[page_id] = entry
+            if analysis not in entry['results']:
+                entry['results'][analysis] = extract(document)
+                changed += 1
+
+    print(f"Incremental sync: {changed} of {len(pages)} page(s) re-extracted, "
+          f"{len(pages) - changed} from snapshots", file=log)
+
+    store.save(file_key, {'version': version, 'pages': new_pages})
+    results = [
+        (page_id, page_name, new_pages[page_id]['results'][analysis])
+        for page_id, page_name in pages
+        if analysis in new_pages.get(page_id, {}).get('results', {})
+    ]
+    return file_data, results
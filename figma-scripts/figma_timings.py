@@ -0,0 +1,154 @@
+"""Per-phase timing and request instrumentation for the figma-scripts.
+
+The shared modules record into one process-wide Timings instance: named
+phases (token, fetch, decode, traversal, stream, output, ...), every HTTP
+request with its status, time to headers and body size, and counters such
+as nodes visited and cache hits and misses. Recording is always on and
+cheap. Scripts run with --timings write it out as JSON when they finish, and
+--profile additionally runs the command under cProfile.
+
+Phases may nest (output includes the traversal that prints the tree) and
+phases run on worker threads are summed, so they can add up to more than
+the wall time.
+"""
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+
+class Timings:
+    """Thread-safe collector of phase durations, requests and counters."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.requests = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one occurrence of the named phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            entry = self.phases.setdefault(name, {'seconds': 0.0, 'count': 0})
+            entry['seconds'] += seconds
+            entry['count'] += 1
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_request(self, method, url, status, header_seconds, body_bytes, body_seconds, encoding=None):
+        """Record one HTTP exchange.
+
+        body_bytes counts bytes on the wire (compressed when encoding is
+        set); body_seconds spans the reads, including any parsing between them.
+        """
+        with self._lock:
+            self.requests.append({
+                'method': method,
+                'url': url,
+                'status': status,
+                'seconds': round(header_seconds, 6),
+                'body_seconds': round(body_seconds, 6),
+                'bytes': body_bytes,
+                'encoding': encoding,
+            })
+            self.counters['bytes_received'] = self.counters.get('bytes_received', 0) + body_bytes
+
+    def report(self):
+        """Return everything recorded so far as a JSON-serialisable dict."""
+        with self._lock:
+            counters = dict(self.counters)
+            return {
+                'script': os.path.basename(sys.argv[0]),
+                'argv': sys.argv[1:],
+                'wall_seconds': round(time.perf_counter() - self.started, 6),
+                'phases': {
+                    name: {'seconds': round(entry['seconds'], 6), 'count': entry['count']}
+                    for name, entry in self.phases.items()
+                },
+                'requests': {
+                    'count': len(self.requests),
+                    'seconds': round(sum(request['seconds'] for request in self.requests), 6),
+                    'bytes': sum(request['bytes'] for request in self.requests),
+                    'log': list(self.requests),
+                },
+                'bytes_received': counters.pop('bytes_received', 0),
+                'nodes_visited': counters.pop('nodes_visited', 0),
+                'cache': {
+                    'hits': counters.pop('cache_hits', 0),
+                    'misses': counters.pop('cache_misses', 0),
+                },
+                'counters': counters,
+            }
+
+
+_timings = Timings()
+
+
+def get_timings():
+    """Return the process-wide Timings instance."""
+    return _timings
+
+
+def reset_timings():
+    """Start a fresh Timings instance, e.g. for each command run by a long-lived process."""
+    global _timings
+    _timings = Timings()
+    return _timings
+
+
+def phase(name):
+    """Shortcut for get_timings().phase(name)."""
+    return _timings.phase(name)
+
+
+def add_timing_arguments(parser):
+    """Add --timings and --profile to a script's parser."""
+    parser.add_argument(
+        '--timings', nargs='?', const='-', metavar='FILE',
+        help='Write per-phase durations, requests, bytes, node counts and cache hits as JSON to FILE (default: stderr)'
+    )
+    parser.add_argument('--profile', metavar='FILE', help='Run under cProfile and save the stats to FILE (view with python3 -m pstats FILE)')
+
+
+def write_report(destination):
+    """Write the timings report as JSON to a file path, or stderr for '-'."""
+    text = json.dumps(_timings.report(), indent=2)
+    if destination == '-':
+        print(text, file=sys.stderr)
+        return
+    with open(destination, 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
+
+
+@contextlib.contextmanager
+def instrument(args):
+    """Profile and report the enclosed command as requested by --timings and --profile.
+
+    The report is written even when the command fails or exits early.
+    """
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield _timings
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.timings:
+            write_report(args.timings)
@@ -0,0 +1,375 @@
+"""Design token extraction shared by figma-styles.py and the other scripts.
+
+StyleCollector is a figma_tree visitor, so style extraction can share a
+single document walk with other extractors. cluster_colors and
+cluster_effects consolidate the collected tokens afterwards, merging
+colors that are perceptually indistinguishable (NumPy speeds up the color
+conversion when installed, but is not required).
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# CIE76 distance commonly taken as just noticeable
+DEFAULT_DELTA_E = 2.3
+
+# sRGB (D65) to XYZ, and the D65 white point
+_RGB_TO_XYZ = (
+    (0.4124564, 0.3575761, 0.1804375),
+    (0.2126729, 0.7151522, 0.0721750),
+    (0.0193339, 0.1191920, 0.9503041),
+)
+_WHITE = (0.95047, 1.0, 1.08883)
+
+# Linear-light value of each 8-bit sRGB channel value
+_LINEAR = [c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4 for c in (v / 255 for v in range(256))]
+
+
+def rgba_to_hex(color):
+    """Convert RGBA color object to hex string."""
+    r = int(color.get('r', 0) * 255)
+    g = int(color.get('g', 0) * 255)
+    b = int(color.get('b', 0) * 255)
+    a = color.get('a', 1)
+    
+    if a < 1:
+        return f"#{r:02x}{g:02x}{b:02x} (opacity: {a:.2f})"
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def extract_fills(fills):
+    """Extract color information from fills."""
+    colors = []
+    if not fills:
+        return colors
+    
+    for fill in fills:
+        if fill.get('type') == 'SOLID' and fill.get('visible', True):
+            color = fill.get('color')
+            if color:
+                colors.append(rgba_to_hex(color))
+    return colors
+
+
+def extract_text_style(style):
+    """Extract text style information."""
+    info = {}
+    if 'fontFamily' in style:
+        info['font'] = style['fontFamily']
+    if 'fontSize' in style:
+        info['size'] = f"{style['fontSize']}px"
+    if 'fontWeight' in style:
+        info['weight'] = style['fontWeight']
+    if 'lineHeightPx' in style:
+        info['line_height'] = f"{style['lineHeightPx']}px"
+    if 'letterSpacing' in style:
+        info['letter_spacing'] = style['letterSpacing']
+    if 'textAlignHorizontal' in style:
+        info['align'] = style['textAlignHorizontal']
+    return info
+
+
+def extract_effects(effects):
+    """Extract effect information."""
+    effect_list = []
+    if not effects:
+        return effect_list
+    
+    for effect in effects:
+        if effect.get('visible', True):
+            effect_type = effect.get('type', 'UNKNOWN')
+            effect_info = {'type': effect_type}
+            
+            if 'color' in effect:
+                effect_info['color'] = rgba_to_hex(effect['color'])
+            if 'radius' in effect:
+                effect_info['radius'] = effect['radius']
+            if 'offset' in effect:
+                offset = effect['offset']
+                effect_info['offset'] = f"x:{offset.get('x', 0)}, y:{offset.get('y', 0)}"
+            
+            effect_list.append(effect_info)
+    
+    return effect_list
+
+
+def extract_grids(grids):
+    """Extract layout grid information."""
+    keys = ('pattern', 'count', 'sectionSize', 'gutterSize', 'offset', 'alignment')
+    return [
+        {key: grid[key] for key in keys if key in grid}
+        for grid in grids or []
+        if grid.get('visible', True)
+    ]
+
+
+def style_values(style_type, node):
+    """Return the values a published style's node defines, as a list of info dicts."""
+    if style_type == 'FILL':
+        return [{'color': color} for color in extract_fills(node.get('fills'))]
+    if style_type == 'TEXT':
+        info = extract_text_style(node.get('style') or {})
+        return [info] if info else []
+    if style_type == 'EFFECT':
+        return extract_effects(node.get('effects'))
+    if style_type == 'GRID':
+        return extract_grids(node.get('layoutGrids'))
+    return []
+
+
+def token_key(info):
+    """Canonical hashable key for a style dict, independent of field order."""
+    return tuple(sorted(info.items()))
+
+
+def add_token(tokens, key, value, order=0):
+    """Count one use of a token, keeping the earliest-seen value for each key.
+
+    Entries are [value, usage count, order]; order is the node's document
+    position when nodes arrive out of order (see sort_tokens).
+    """
+    entry = tokens.get(key)
+    if entry is None:
+        tokens[key] = [value, 1, order]
+    else:
+        entry[1] += 1
+        if order < entry[2]:
+            entry[0] = value
+            entry[2] = order
+
+
+def sort_tokens(tokens):
+    """Return tokens reordered by the document position they were first seen at."""
+    return dict(sorted(tokens.items(), key=lambda item: item[1][2]))
+
+
+def collect_node_styles(node, colors, text_styles, effects_list, order=0, style_refs=None):
+    """Add one node's colors, text style and effects to the collections.
+
+    style_refs, if given, maps (collection name, token key) to the ID of
+    the first style a node applied that token through.
+    """
+    refs = node.get('styles') if style_refs is not None else None
+    
+    # Extract fills (colors)
+    if 'fills' in node:
+        for color in extract_fills(node['fills']):
+            add_token(colors, color, color, order)
+            if refs and 'fill' in refs:
+                style_refs.setdefault(('colors', color), refs['fill'])
+    
+    # Extract text styles
+    if 'style' in node and node.get('type') in ['TEXT']:
+        text_info = extract_text_style(node['style'])
+        if text_info:
+            # Layers sharing a style count as one token, labelled by the first layer's name
+            key = token_key(text_info)
+            text_info['name'] = node.get('name', 'Unnamed')
+            add_token(text_styles, key, text_info, order)
+            if refs and 'text' in refs:
+                style_refs.setdefault(('text_styles', key), refs['text'])
+    
+    # Extract effects
+    if 'effects' in node:
+        for effect in extract_effects(node['effects']):
+            key = token_key(effect)
+            add_token(effects_list, key, effect, order)
+            if refs and 'effect' in refs:
+                style_refs.setdefault(('effects', key), refs['effect'])
+
+
+def tokens_to_json(tokens):
+    """Serialise a token collection as [key, value, count] lists, in order."""
+    return [[key, value, count] for key, (value, count, _) in tokens.items()]
+
+
+def json_key(key):
+    """Restore a token key serialised to JSON (which turns tuple keys into nested lists)."""
+    if isinstance(key, list):
+        return tuple(tuple(pair) for pair in key)
+    return key
+
+
+def merge_tokens(tokens, entries):
+    """Add serialised [key, value, count] entries into a token collection.
+
+    Entries from later calls sort after existing tokens, so merging pages in
+    document order keeps first-seen order.
+    """
+    for key, value, count in entries:
+        key = json_key(key)
+        entry = tokens.get(key)
+        if entry is None:
+            tokens[key] = [value, count, len(tokens)]
+        else:
+            entry[1] += count
+
+
+class StyleCollector:
+    """Visitor collecting unique colors, text styles and effects with usage counts.
+
+    Each collection is a dict of canonical key -> [value, usage count, order];
+    style_refs maps (collection name, key) to the style a node applied it with.
+    """
+
+    def __init__(self):
+        self.colors = {}
+        self.text_styles = {}
+        self.effects = {}
+        self.style_refs = {}
+
+    def enter(self, node, depth, ancestors, order):
+        collect_node_styles(node, self.colors, self.text_styles, self.effects, order, self.style_refs)
+
+    def sort(self):
+        """Put tokens back in document order after visiting nodes out of order."""
+        self.colors = sort_tokens(self.colors)
+        self.text_styles = sort_tokens(self.text_styles)
+        self.effects = sort_tokens(self.effects)
+
+    def to_json(self):
+        """Serialise the collected tokens (e.g. for a per-page snapshot)."""
+        return {
+            'colors': tokens_to_json(self.colors),
+            'text_styles': tokens_to_json(self.text_styles),
+            'effects': tokens_to_json(self.effects),
+            'style_refs': [[name, key, style_id] for (name, key), style_id in self.style_refs.items()],
+        }
+
+    def merge_json(self, data):
+        """Merge tokens serialised by to_json, counting uses across both."""
+        merge_tokens(self.colors, data.get('colors', []))
+        merge_tokens(self.text_styles, data.get('text_styles', []))
+        merge_tokens(self.effects, data.get('effects', []))
+        for name, key, style_id in data.get('style_refs', []):
+            self.style_refs.setdefault((name, json_key(key)), style_id)
+
+    def style_name(self, name, key, styles):
+        """Return the name of the style a token was applied with, given the file's styles map."""
+        style_id = self.style_refs.get((name, key))
+        return (styles.get(style_id) or {}).get('name') if style_id else None
+
+
+def parse_color(value):
+    """Split a color formatted by rgba_to_hex into ((r, g, b) in 0-255, opacity suffix)."""
+    hex_part, _, opacity = value.partition(' ')
+    return (int(hex_part[1:3], 16), int(hex_part[3:5], 16), int(hex_part[5:7], 16)), opacity
+
+
+def _lab_f(t):
+    return t ** (1 / 3) if t > 216 / 24389 else (24389 / 27 * t + 16) / 116
+
+
+def rgb_to_lab(rgb):
+    """Convert an 8-bit sRGB triple to CIE Lab."""
+    r, g, b = (_LINEAR[channel] for channel in rgb)
+    x, y, z = (
+        _lab_f((row[0] * r + row[1] * g + row[2] * b) / white)
+        for row, white in zip(_RGB_TO_XYZ, _WHITE)
+    )
+    return 116 * y - 16, 500 * (x - y), 200 * (y - z)
+
+
+def rgb_to_lab_array(rgbs):
+    """Convert a list of 8-bit sRGB triples to Lab triples in one vectorised pass."""
+    c = np.asarray(rgbs, dtype=np.float64).reshape(-1, 3) / 255
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    t = linear @ np.asarray(_RGB_TO_XYZ).T / np.asarray(_WHITE)
+    f = np.where(t > 216 / 24389, np.cbrt(t), (24389 / 27 * t + 16) / 116)
+    lab = np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+    return [tuple(row) for row in lab.tolist()]
+
+
+def cluster_colors(colors, threshold=DEFAULT_DELTA_E):
+    """Merge colors lying within threshold ΔE (CIE76) of a more used color.
+
+    Takes a collection of hex color -> [value, usage count, order] and
+    returns canonical color -> [value, total count, order, aliases] in
+    document order, where aliases lists the merged (color, count) pairs,
+    most used first. Only colors with the same opacity are merged.
+
+    Colors are visited most used first and each joins the nearest canonical
+    color within the threshold or becomes one itself. Canonical colors are
+    bucketed on a Lab grid with cells twice the threshold across, so each
+    color is only compared against the 8 cells its neighbourhood overlaps.
+    """
+    entries = list(colors.values())
+    parsed = [parse_color(value) for value, _, _ in entries]
+    rgbs = [rgb for rgb, _ in parsed]
+    if np is not None and rgbs:
+        labs = rgb_to_lab_array(rgbs)
+    else:
+        labs = [rgb_to_lab(rgb) for rgb in rgbs]
+
+    ranking = sorted(range(len(entries)), key=lambda i: (-entries[i][1], entries[i][2]))
+    limit = threshold * threshold
+    cell_size = 2 * threshold if threshold > 0 else 1
+    grids = {}
+    clusters = {}
+    for i in ranking:
+        value, count, order = entries[i]
+        l, a, b = labs[i]
+        grid = grids.setdefault(parsed[i][1], {})
+        cl, ca, cb = math.floor(l / cell_size), math.floor(a / cell_size), math.floor(b / cell_size)
+        # The neighbouring cell on the side of each axis the color is closer to
+        nl = cl + 1 if l - cl * cell_size > threshold else cl - 1
+        na = ca + 1 if a - ca * cell_size > threshold else ca - 1
+        nb = cb + 1 if b - cb * cell_size > threshold else cb - 1
+        nearest = None
+        nearest_distance = limit
+        for key in (
+            (cl, ca, cb), (cl, ca, nb), (cl, na, cb), (cl, na, nb),
+            (nl, ca, cb), (nl, ca, nb), (nl, na, cb), (nl, na, nb),
+        ):
+            for j in grid.get(key, ()):
+                ol, oa, ob = labs[j]
+                distance = (l - ol) * (l - ol) + (a - oa) * (a - oa) + (b - ob) * (b - ob)
+                if distance <= nearest_distance:
+                    nearest, nearest_distance = j, distance
+        if nearest is None:
+            grid.setdefault((cl, ca, cb), []).append(i)
+            clusters[i] = [value, count, order, []]
+        else:
+            cluster = clusters[nearest]
+            cluster[1] += count
+            cluster[2] = min(cluster[2], order)
+            cluster[3].append((value, count))
+
+    return {
+        cluster[0]: cluster
+        for cluster in sorted(clusters.values(), key=lambda cluster: cluster[2])
+    }
+
+
+def cluster_effects(effects, color_clusters):
+    """Merge effects that differ only by colors merged in color_clusters.
+
+    Returns token key -> [value, total count, order, aliases] like
+    cluster_colors, aliases being the merged (original color, count) pairs.
+    """
+    canonical = {
+        alias: color
+        for color, (_, _, _, aliases) in color_clusters.items()
+        for alias, _ in aliases
+    }
+    merged = {}
+    for value, count, order in effects.values():
+        alias = None
+        if value.get('color') in canonical:
+            alias = value['color']
+            value = dict(value, color=canonical[alias])
+        key = token_key(value)
+        entry = merged.get(key)
+        if entry is None:
+            entry = merged[key] = [value, 0, order, []]
+        entry[1] += count
+        entry[2] = min(entry[2], order)
+        if alias is not None:
+            entry[3].append((alias, count))
+    for entry in merged.values():
+        entry[3].sort(key=lambda alias: -alias[1])
+    return dict(sorted(merged.items(), key=lambda item: item[1][2]))
@@ -0,0 +1,224 @@
+"""Helpers for working with Figma document trees shared by the figma-scripts.
+
+walk() is the single traversal engine: it visits the tree once with an
+explicit stack (so deeply nested files cannot hit the recursion limit) and
+feeds every node to any number of visitors. A visitor is any object with an
+
+    enter(node, depth, ancestors, order)
+
+method. ancestors is the list of enclosing nodes (only valid during the
+call) and order is the node's pre-order position. Returning SKIP from enter
+prunes the node's subtree for that visitor only.
+"""
+import io
+import json
+import sys
+import time
+from collections import namedtuple
+
+from figma_timings import get_timings
+
+
+# Node types that count as a "containing frame", as in the /components metadata
+FRAME_TYPES = ('FRAME', 'SECTION', 'COMPONENT_SET')
+
+SKIP = object()
+
+NodeLocation = namedtuple('NodeLocation', ['node', 'parent_id', 'page', 'frame'])
+NodeLocation.__doc__ = """Where a node sits: its parent ID, page name and nearest containing frame name."""
+
+# Stack marker for leaving a node's subtree
+_EXIT = object()
+
+
+def skip_hidden(node):
+    """Prune predicate that skips invisible nodes and everything under them."""
+    return node.get('visible', True) is False
+
+
+def walk(root, visitors, max_depth=None, prune=None):
+    """Walk the tree once in document order, feeding each node to every visitor.
+
+    Nodes deeper than max_depth (root is depth 0) are not visited, and
+    prune(node) returning true skips a node with its whole subtree. Returns
+    the number of nodes visited.
+    """
+    timings = get_timings()
+    started = time.perf_counter()
+    ancestors = []
+    # Depth at which each visitor returned SKIP, or None while it is active
+    skipped_at = [None] * len(visitors)
+    stack = [(root, 0)]
+    order = 0
+
+    while stack:
+        node, depth = stack.pop()
+        if node is _EXIT:
+            ancestors.pop()
+            for i, skip_depth in enumerate(skipped_at):
+                if skip_depth == depth:
+                    skipped_at[i] = None
+            continue
+        if prune is not None and prune(node):
+            continue
+
+        active = False
+        for i, visitor in enumerate(visitors):
+            if skipped_at[i] is not None:
+                continue
+            if visitor.enter(node, depth, ancestors, order) is SKIP:
+                skipped_at[i] = depth
+            else:
+                active = True
+        order += 1
+
+        children = node.get('children')
+        if children and (max_depth is None or depth < max_depth):
+            if active:
+                ancestors.append(node)
+                stack.append((_EXIT, depth))
+                for child in reversed(children):
+                    stack.append((child, depth + 1))
+                continue
+        # No descent, so visitors pruned here are active again for the siblings
+        for i, skip_depth in enumerate(skipped_at):
+            if skip_depth == depth:
+                skipped_at[i] = None
+
+    timings.add_phase('traversal', time.perf_counter() - started)
+    timings.count('nodes_visited', order)
+    return order
+
+
+class NodeIndexer:
+    """Visitor mapping every node ID to its NodeLocation."""
+
+    def __init__(self):
+        self.index = {}
+
+    def enter(self, node, depth, ancestors, order):
+        parent_id = page = frame = None
+        if ancestors:
+            parent = ancestors[-1]
+            parent_id = parent.get('id')
+            parent_location = self.index.get(parent_id)
+            if parent_location:
+                page = parent_location.page
+                frame = parent_location.frame
+            if parent.get('type') == 'CANVAS':
+                page = parent.get('name', 'Unknown Page')
+            elif parent.get('type') in FRAME_TYPES:
+                frame = parent.get('name')
+        node_id = node.get('id')
+        if node_id is not None:
+            self.index[node_id] = NodeLocation(node, parent_id, page, frame)
+
+
+class PageLocator:
+    """Visitor recording the page name of selected node IDs."""
+
+    def __init__(self, node_ids):
+        self.node_ids = set(node_ids)
+        self.pages = {}
+
+    def enter(self, node, depth, ancestors, order):
+        node_id = node.get('id')
+        if node_id not in self.node_ids:
+            return
+        # Pages sit right under the document, so this scan stops almost at once
+        for ancestor in ancestors:
+            if ancestor.get('type') == 'CANVAS':
+                self.pages[node_id] = ancestor.get('name', 'Unknown Page')
+                break
+
+
+class TypeCollector:
+    """Visitor collecting the IDs of nodes whose type is in types."""
+
+    def __init__(self, types):
+        self.types = set(types)
+        self.ids = []
+
+    def enter(self, node, depth, ancestors, order):
+        if node.get('type') in self.types:
+            self.ids.append(node.get('id'))
+
+
+class PrunedVisitor:
+    """Visitor wrapper that hides the subtrees prune(node) selects from one visitor only.
+
+    Lets visitors with different pruning share a single walk.
+    """
+
+    def __init__(self, visitor, prune):
+        self.visitor = visitor
+        self.prune = prune
+
+    def enter(self, node, depth, ancestors, order):
+        if self.prune(node):
+            return SKIP
+        return self.visitor.enter(node, depth, ancestors, order)
+
+
+class TreePrinter:
+    """Visitor writing each node as one line of an indented tree, down to max_depth if given."""
+
+    def __init__(self, show_type=True, out=None, max_depth=None):
+        self.show_type = show_type
+        self.write = (out or sys.stdout).write
+        self.max_depth = max_depth
+
+    def enter(self, node, depth, ancestors, order):
+        prefix = "  " * depth
+        node_id = node.get('id', 'N/A')
+        node_name = node.get('name', 'Unnamed')
+
+        if self.show_type:
+            self.write(f"{prefix}├─ [{node.get('type', 'UNKNOWN')}] {node_name} (id: {node_id})\n")
+        else:
+            self.write(f"{prefix}├─ {node_name} (id: {node_id})\n")
+        if self.max_depth is not None and depth >= self.max_depth:
+            return SKIP
+
+
+class NdjsonWriter:
+    """Visitor writing each node's own properties as one JSON line.
+
+    children is replaced by the node's depth and parentId, so every line
+    stands alone and the output can be streamed without the tree.
+    """
+
+    def __init__(self, out=None):
+        self.write = (out or sys.stdout).write
+        self.encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def enter(self, node, depth, ancestors, order):
+        record = {key: value for key, value in node.items() if key != 'children'}
+        record['depth'] = depth
+        record['parentId'] = ancestors[-1].get('id') if ancestors else None
+        self.write(self.encode(record) + '\n')
+
+
+def build_node_index(document, prune=None):
+    """Walk the document once and map every node ID to its NodeLocation."""
+    indexer = NodeIndexer()
+    walk(document, [indexer], prune=prune)
+    return indexer.index
+
+
+def print_tree(node, show_type=True, prune=None, out=None):
+    """Print the node tree."""
+    walk(node, [TreePrinter(show_type, out)], prune=prune)
+
+
+def buffered_stdout(buffer_size=1024 * 1024):
+    """Return a large-buffered UTF-8 text stream on stdout; flush it when done.
+
+    Falls back to sys.stdout itself when it is not backed by a file
+    descriptor (e.g. when redirected inside figma_daemon).
+    """
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return sys.stdout
+    return io.open(fd, 'w', encoding='utf-8', buffering=buffer_size, closefd=False)
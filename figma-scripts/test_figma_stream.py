@@ -0,0 +1,68 @@
+"""Tests for figma_stream's incremental parser.
+
+Run with: python3 -m unittest test_figma_stream (from figma-scripts/)
+"""
+import io
+import json
+import unittest
+
+from figma_stream import NodeStream
+
+
+def sample_document():
+    """A small /v1/files response with floats, exponents, negatives and literals on nodes."""
+    frames = []
+    for i in range(6):
+        frames.append({
+            'id': f'1:{i}', 'name': f'Frame {i}', 'type': 'FRAME', 'visible': i % 2 == 0,
+            'opacity': 0.123456, 'strokeWeight': 1.5e-3, 'x': -12.75, 'y': 1e10, 'rotation': 0,
+            'fills': [{'type': 'SOLID', 'color': {'r': 0.5, 'g': 0.25, 'b': 1, 'a': 1.0}}],
+            'children': [
+                {'id': f'2:{i}', 'name': 'Label', 'type': 'TEXT', 'characters': 'Hi, "there"',
+                 'style': {'fontSize': 12.5, 'lineHeightPx': 14.0625}, 'layoutGrow': None},
+            ],
+        })
+    return {
+        'name': 'Sample', 'version': '42', 'lastModified': '2024-01-01T00:00:00Z',
+        'document': {'id': '0:0', 'name': 'Document', 'type': 'DOCUMENT', 'children': [
+            {'id': '0:1', 'name': 'Page 1', 'type': 'CANVAS', 'children': frames},
+        ]},
+        'schemaVersion': 0, 'thumbnailScale': 2.5,
+    }
+
+
+def expected_nodes(document):
+    """Return each node without its children, in pre-order, as json.loads sees them."""
+    nodes = []
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        nodes.append({key: value for key, value in node.items() if key != 'children'})
+        stack.extend(reversed(node.get('children', [])))
+    return nodes
+
+
+class NodeStreamTest(unittest.TestCase):
+    def test_matches_json_loads_at_every_read_size(self):
+        raw = json.dumps(sample_document()).encode('utf-8')
+        reference = json.loads(raw)
+        nodes = expected_nodes(reference['document'])
+        meta = {key: value for key, value in reference.items() if key != 'document'}
+
+        for read_size in range(1, len(raw) + 2):
+            with self.subTest(read_size=read_size):
+                stream = NodeStream(io.BytesIO(raw), read_size=read_size)
+                items = sorted(stream, key=lambda item: item.order)
+                self.assertEqual([item.node for item in items], nodes)
+                self.assertEqual(stream.meta, meta)
+
+    def test_pretty_printed_input(self):
+        raw = json.dumps(sample_document(), indent=2).encode('utf-8')
+        for read_size in (1, 2, 3, 7, 64):
+            with self.subTest(read_size=read_size):
+                items = list(NodeStream(io.BytesIO(raw), read_size=read_size))
+                self.assertEqual(len(items), len(expected_nodes(sample_document()['document'])))
+
+
+if __name__ == '__main__':
+    unittest.main()